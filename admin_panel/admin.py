@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import *
+from .search import search_subcategories
 
 
 class SubCategoryInline(admin.TabularInline):  
@@ -25,6 +26,12 @@ class SubCategoryAdmin(admin.ModelAdmin):
     ordering = ('-created_date',)
     readonly_fields = ('created_date', 'updated_date')
 
+    def get_search_results(self, request, queryset, search_term):
+        # full-text index instead of icontains scans over three text columns
+        if not search_term:
+            return queryset, False
+        return search_subcategories(queryset, search_term), False
+
 
 @admin.register(SubCategoryItem)
 class SubCategoryItemAdmin(admin.ModelAdmin):
@@ -32,3 +39,12 @@ class SubCategoryItemAdmin(admin.ModelAdmin):
     list_filter = ("subcategory",)
     search_fields = ("title", "subcategory__name")
     ordering = ("-created_date",)
+
+
+@admin.register(SectionRanking)
+class SectionRankingAdmin(admin.ModelAdmin):
+    list_display = ("id", "section", "subcategory", "score", "bookings_7d", "bookings_30d", "refreshed_at")
+    list_filter = ("section",)
+    list_select_related = ("subcategory",)
+    ordering = ("section", "-score")
+    readonly_fields = ("score", "bookings_7d", "bookings_30d", "last_booked_at", "refreshed_at")
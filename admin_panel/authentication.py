@@ -3,6 +3,73 @@ from rest_framework.exceptions import AuthenticationFailed
 from customer.models import CustomerProfile
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+import time
+from .checks import cache_is_shared
+from .user_cache import user_cache
+
+CLAIMS_REVOKED_KEY = "auth:claims-revoked:{}"
+
+
+def tokens_for_user(user):
+    """
+    RefreshToken for `user` carrying the claims that stateless auth needs.
+    The access token derived from it copies these claims.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh["role"] = user.role
+    refresh["is_blocked"] = user.is_blocked
+    return refresh
+
+
+def revoke_claims(user_ids):
+    """
+    Stop trusting role/is_blocked claims in tokens issued up to now for these
+    users. Entries only need to outlive the access tokens they guard.
+    """
+    revoked_at = time.time()
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    cache.set_many({CLAIMS_REVOKED_KEY.format(user_id): revoked_at for user_id in user_ids}, timeout)
+
+
+def claims_revoked(user_id, issued_at):
+    revoked_at = cache.get(CLAIMS_REVOKED_KEY.format(user_id))
+    return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+
+def _load_user(user_id):
+    user = user_cache.get(user_id)
+    user.is_authenticated = True
+    return user
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    Lightweight request.user built from token claims. id, role and is_blocked
+    come straight from the token; touching any other profile attribute loads
+    the full CustomerProfile (through the user cache) on first access.
+    """
+
+    def __init__(self, validated_token):
+        user_id = int(validated_token["user_id"])
+        super().__init__(lambda: _load_user(user_id))
+        self.__dict__.update(
+            id=user_id,
+            pk=user_id,
+            role=validated_token["role"],
+            is_blocked=validated_token.get("is_blocked", False),
+            is_authenticated=True,
+            is_anonymous=False,
+        )
+
+    def __bool__(self):
+        # permission classes test `request.user and ...`, that must not load the profile
+        return True
+
 
 class CustomerJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
@@ -10,14 +77,26 @@ class CustomerJWTAuthentication(JWTAuthentication):
         if user_id is None:
             raise AuthenticationFailed("Token contained no recognizable user identification")
 
-        try:
-            user = CustomerProfile.objects.get(id=user_id)
-            user.is_authenticated = True
-            return user
-        except CustomerProfile.DoesNotExist:
-            raise AuthenticationFailed("User not found")
-        except (TokenError, InvalidToken):
-            raise AuthenticationFailed("Token is invalid or expired")
+        # revocations are only seen by every worker through a shared cache
+        if (
+            getattr(settings, "AUTH_STATELESS_CLAIMS", False)
+            and cache_is_shared()
+            and "role" in validated_token
+            and not claims_revoked(user_id, validated_token.get("iat"))
+        ):
+            user = ClaimsUser(validated_token)
+        else:
+            try:
+                user = user_cache.get(user_id)
+                user.is_authenticated = True
+            except CustomerProfile.DoesNotExist:
+                raise AuthenticationFailed("User not found")
+            except (TokenError, InvalidToken):
+                raise AuthenticationFailed("Token is invalid or expired")
+
+        if user.is_blocked:
+            raise AuthenticationFailed("User is blocked")
+        return user
 
 
 class IsAdminRole(BasePermission):
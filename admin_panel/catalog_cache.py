@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+# The version, the payloads and the rebuild lock live in the default cache,
+# which must be shared by every worker (see CACHES in settings): with a
+# per-process cache a catalog edit only invalidates the worker that made it.
+VERSION_KEY = "catalog:version"
+CHANGED_AT_KEY = "catalog:changed_at"
+
+DEFAULTS = {
+    "TTL": 3600,           # seconds a serialized payload is kept for one catalog version
+    "LOCK_TIMEOUT": 10,    # seconds a builder may hold the cross-process rebuild lock
+    "WAIT_INTERVAL": 0.05,
+}
+
+
+def _setting(name):
+    return getattr(settings, "CATALOG_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock, not 1, so a lost version key can't resurrect stale entries
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog payload by moving to a new version."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalog_version()
+    cache.set(CHANGED_AT_KEY, timezone.now(), None)
+
+
+def catalog_changed_at():
+    """When the catalog last changed in any way, including deletes that max(updated_date) can't see."""
+    return cache.get(CHANGED_AT_KEY)
+
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        return _local_locks.setdefault(key, threading.Lock())
+
+
+def cached_payload(name, parts, build):
+    """
+    Return the payload (usually a (body, status) pair) for `name` + `parts`
+    at the current catalog version, calling `build()` only on a miss.
+
+    Misses are single-flight: inside a worker, threads queue on a lock for
+    the key; across workers, the first one to cache.add() the lock key
+    builds while the others poll the cache until the payload shows up (or the
+    lock times out, in which case they build it themselves).
+    """
+    key = "catalog:{}:{}:{}".format(catalog_version(), name, ":".join(str(part) for part in parts))
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    with _local_lock(key):
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+
+        lock_key = f"{key}:lock"
+        if not cache.add(lock_key, 1, _setting("LOCK_TIMEOUT")):
+            deadline = time.monotonic() + _setting("LOCK_TIMEOUT")
+            while time.monotonic() < deadline:
+                time.sleep(_setting("WAIT_INTERVAL"))
+                payload = cache.get(key)
+                if payload is not None:
+                    return payload
+
+        try:
+            payload = build()
+            cache.set(key, payload, _setting("TTL"))
+        finally:
+            cache.delete(lock_key)
+
+    with _local_locks_guard:
+        _local_locks.pop(key, None)
+    return payload
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Warning, register
+
+
+# backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias="default"):
+    """Whether every worker reads and writes the same entries in this cache."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_CACHES)
+
+
+@register()
+def stateless_claims_check(app_configs, **kwargs):
+    if getattr(settings, "AUTH_STATELESS_CLAIMS", False) and not cache_is_shared():
+        return [Error(
+            "AUTH_STATELESS_CLAIMS needs a shared cache.",
+            hint="Set REDIS_URL. Claims revocations in a per-process cache only reach the worker that "
+                 "made them, so token claims are not trusted until then.",
+            id="admin_panel.E001",
+        )]
+    return []
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    if not settings.DEBUG and not cache_is_shared():
+        return [Warning(
+            "The default cache is private to each process.",
+            hint="Set REDIS_URL. Catalog cache versions and the provider index change log in a "
+                 "per-process cache leave other workers serving the old catalog and providers after an edit.",
+            id="admin_panel.W001",
+        )]
+    return []
@@ -0,0 +1,39 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+
+class Validators:
+    """
+    ETag / Last-Modified for the rows behind a GET, from one aggregate query.
+
+    The ETag covers max(updated_date), the row count (so deletes change it
+    too) and `changed_at`, plus any `variant` parts that change the
+    representation, e.g. the serializer picked for the user's role or the
+    page being returned. If-None-Match wins over If-Modified-Since, so
+    anything that moves Last-Modified has to move the ETag as well.
+    """
+
+    def __init__(self, queryset, *variant, date_field="updated_date", changed_at=None):
+        stats = queryset.aggregate(last_modified=Max(date_field), count=Count("pk"))
+        self.count = stats["count"]
+
+        timestamps = [ts for ts in (stats["last_modified"], changed_at) if ts is not None]
+        self.last_modified = int(max(ts.timestamp() for ts in timestamps)) if timestamps else None
+
+        fingerprint = ":".join(str(part) for part in (stats["last_modified"], self.count, changed_at, *variant))
+        self.etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+
+    def not_modified(self, request):
+        """A 304 (or 412) response if the client's copy is current, else None."""
+        return get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+
+    def apply(self, response):
+        response["ETag"] = self.etag
+        if self.last_modified is not None:
+            response["Last-Modified"] = http_date(self.last_modified)
+        # clients must revalidate instead of guessing freshness from Last-Modified
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the materialized home-screen section rankings from recent bookings. "
+        "Run it every few minutes; add --full now and then (e.g. nightly) to rebuild from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Drop and recompute every ranking")
+
+    def handle(self, *args, **options):
+        results = refresh_rankings(full=options["full"])
+        for section, (written, deleted) in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{section}: {written} written, {deleted} removed"))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0004_subcategoryitem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['created_date', 'id'], name='category_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['category', 'created_date', 'id'], name='subcategory_cat_created_idx'),
+        ),
+    ]
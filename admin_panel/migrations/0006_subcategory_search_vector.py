@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The 'simple' config (no stemming) keeps prefix matching predictable for type-ahead;
+# it must match admin_panel.search.SEARCH_CONFIG.
+CREATE_SEARCH_SQL = """
+CREATE FUNCTION admin_panel_subcategory_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.faqs, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER admin_panel_subcategory_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON admin_panel_subcategory
+    FOR EACH ROW EXECUTE FUNCTION admin_panel_subcategory_search_vector();
+
+UPDATE admin_panel_subcategory SET name = name;
+
+CREATE INDEX subcategory_search_gin ON admin_panel_subcategory USING gin (search_vector);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS subcategory_search_gin;
+DROP TRIGGER IF EXISTS admin_panel_subcategory_search_vector_trigger ON admin_panel_subcategory;
+DROP FUNCTION IF EXISTS admin_panel_subcategory_search_vector();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # other backends (SQLite test runs) use the iregex fallback in admin_panel.search
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subcategory',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,78 @@
+import re
+import sys
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# "₹ 1,499", "Rs. 499/-", "499 INR" -> 1499 / 499 / 499
+PRICE_NOISE = re.compile(r"(?i)(₹|rs\.?|inr|/-|,|\s)")
+
+
+def parse_price(text):
+    try:
+        value = Decimal(PRICE_NOISE.sub("", text or ""))
+    except InvalidOperation:
+        return None
+    if not value.is_finite() or value < 0 or value >= Decimal("100000000"):
+        return None
+    return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def copy_prices(apps, schema_editor):
+    SubCategory = apps.get_model("admin_panel", "SubCategory")
+    failed = []
+    rows = SubCategory.objects.only("id", "price").order_by("id")
+    for subcategory in rows.iterator(chunk_size=500):
+        amount = parse_price(subcategory.price)
+        if amount is None:
+            failed.append((subcategory.id, subcategory.price))
+            continue
+        SubCategory.objects.filter(id=subcategory.id).update(price_amount=amount)
+
+    if failed:
+        sys.stdout.write(f"\n  {len(failed)} SubCategory prices could not be parsed and were left empty:\n")
+        for subcategory_id, text in failed:
+            sys.stdout.write(f"    SubCategory #{subcategory_id}: {text!r}\n")
+
+
+def copy_prices_back(apps, schema_editor):
+    SubCategory = apps.get_model("admin_panel", "SubCategory")
+    for subcategory in SubCategory.objects.only("id", "price_amount").iterator(chunk_size=500):
+        text = "" if subcategory.price_amount is None else str(subcategory.price_amount)
+        SubCategory.objects.filter(id=subcategory.id).update(price=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subcategory',
+            name='price_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(copy_prices, copy_prices_back),
+        # a default lets the reverse migration re-add the text column to a populated table
+        migrations.AlterField(
+            model_name='subcategory',
+            name='price',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='subcategory',
+            name='price',
+        ),
+        migrations.RenameField(
+            model_name='subcategory',
+            old_name='price_amount',
+            new_name='price',
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['category', 'price', 'id'], name='subcategory_cat_price_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0008_subcategory_decimal_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('most_booked', 'Most booked'), ('new', 'New'), ('premium', 'Premium')], max_length=20)),
+                ('score', models.FloatField(default=0.0)),
+                ('bookings_7d', models.PositiveIntegerField(default=0)),
+                ('bookings_30d', models.PositiveIntegerField(default=0)),
+                ('last_booked_at', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField()),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='admin_panel.subcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['section', '-score', 'subcategory'], name='sectionranking_feed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('section', 'subcategory'), name='unique_section_ranking')],
+            },
+        ),
+    ]
@@ -1,14 +1,22 @@
 from django.db import models
 from customer.models import CustomerProfile
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.contrib.postgres.search import SearchVectorField
 
 
 class Category(models.Model):
     category_name = models.CharField(max_length=100,blank=False, null=False, unique=True)
     image = models.FileField(upload_to='category_images/', blank=True, null=True)
+    # resized copies of image, written by the background worker in customer/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_date', 'id'], name='category_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.category_name
 
@@ -22,9 +30,20 @@ class SubCategory(models.Model):  # This is your "Service or sub_category"
     section = models.CharField(max_length=50,blank=False, null=False)  # most, premium, new, nearby
     steps = models.TextField(blank=False, null=False)
     faqs = models.TextField(blank=False, null=False)
-    price = models.CharField(max_length=50,blank=False, null=False)
+    # null only for legacy rows whose text price couldn't be parsed (see migration 0008)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=False, null=True)
+    # resized copies of cover_image and image, written by the background worker in customer/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
+    # name/description/faqs tsvector, maintained by a DB trigger on Postgres (see admin_panel/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'created_date', 'id'], name='subcategory_cat_created_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='subcategory_cat_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -39,4 +58,35 @@ class SubCategoryItem(models.Model):
     updated_date = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.subcategory.name} - Step {self.step_no}: {self.title}"
\ No newline at end of file
+        return f"{self.subcategory.name} - Step {self.step_no}: {self.title}"
+
+class SectionRanking(models.Model):
+    """Precomputed home-screen sections, refreshed by `manage.py refresh_section_rankings`."""
+    MOST_BOOKED = 'most_booked'
+    NEW = 'new'
+    PREMIUM = 'premium'
+    SECTION_CHOICES = [
+        (MOST_BOOKED, 'Most booked'),
+        (NEW, 'New'),
+        (PREMIUM, 'Premium'),
+    ]
+
+    section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name='rankings')
+    score = models.FloatField(default=0.0)
+    bookings_7d = models.PositiveIntegerField(default=0)
+    bookings_30d = models.PositiveIntegerField(default=0)
+    last_booked_at = models.DateTimeField(blank=True, null=True)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['section', 'subcategory'], name='unique_section_ranking'),
+        ]
+        indexes = [
+            # the feed reads only these columns, so it's an index-only scan
+            models.Index(fields=['section', '-score', 'subcategory'], name='sectionranking_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.section} #{self.subcategory_id} ({self.score:.2f})"
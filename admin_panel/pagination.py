@@ -0,0 +1,82 @@
+import base64
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+
+
+def page_limit(request):
+    default = getattr(settings, "API_PAGE_SIZE", 50)
+    maximum = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+    try:
+        limit = int(request.query_params.get("limit", default))
+    except (TypeError, ValueError):
+        raise ParseError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def _cursor_value(value):
+    # full precision: DjangoJSONEncoder drops microseconds, which would skip rows
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_cursor_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, model, fields):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        raise ParseError("Invalid cursor")
+
+
+def paginate(request, queryset, ordering=("-created_date", "-id")):
+    """
+    Keyset pagination: returns (rows, next_cursor) for the page selected by
+    the `cursor` and `limit` query params.
+
+    The cursor is the ordering values of the last row served, so each page is
+    a `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n` range scan on a matching
+    composite index, however deep the client pages. The last field of
+    `ordering` must be unique (the pk) to keep pages stable.
+    """
+    fields = [name.lstrip("-") for name in ordering]
+    limit = page_limit(request)
+
+    cursor = request.query_params.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, fields)
+        after = Q()
+        for position, name in enumerate(ordering):
+            lookup = "lt" if name.startswith("-") else "gt"
+            step = Q(**{f"{fields[position]}__{lookup}": values[position]})
+            for previous in range(position):
+                step &= Q(**{fields[previous]: values[previous]})
+            after |= step
+        queryset = queryset.filter(after)
+
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name in fields])
+    return rows, next_cursor
+
+
+def page_key(request):
+    """Part of a cache key / ETag that identifies the requested page."""
+    return f"{request.query_params.get('cursor', '')}:{page_limit(request)}"
@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from customer.models import ServiceBook
+from .models import SectionRanking, SubCategory
+
+
+DEFAULTS = {
+    "WEIGHT_7D": 3.0,            # points per booking in the last 7 days
+    "WEIGHT_30D": 1.0,           # points per booking in the last 30 days
+    "RECENCY_SECONDS": 86400,    # a last booking this much newer is worth one more point
+    "NEW_DAYS": 30,              # how long a new service stays in the "new" section
+}
+
+# bookings committed late with an earlier created_date are still picked up
+COMMIT_LAG = timedelta(minutes=5)
+
+RANKED_FIELDS = ["score", "bookings_7d", "bookings_30d", "last_booked_at"]
+
+
+def _setting(name):
+    return getattr(settings, "SECTION_RANKINGS", {}).get(name, DEFAULTS[name])
+
+
+def booking_score(bookings_7d, bookings_30d, last_booked_at):
+    # the recency term grows with absolute time instead of decaying, so a score only
+    # changes when its own bookings do and incremental refreshes stay exact
+    recency = last_booked_at.timestamp() / _setting("RECENCY_SECONDS") if last_booked_at else 0.0
+    return _setting("WEIGHT_7D") * bookings_7d + _setting("WEIGHT_30D") * bookings_30d + recency
+
+
+def _bookings(now):
+    return ServiceBook.objects.filter(service__isnull=False).exclude(status="cancel").filter(created_date__lt=now)
+
+
+def booking_rows(now, service_ids=None):
+    """{subcategory_id: ranking fields} for services booked in the last 30 days."""
+    bookings = _bookings(now).filter(created_date__gte=now - timedelta(days=30))
+    if service_ids is not None:
+        bookings = bookings.filter(service_id__in=service_ids)
+    stats = bookings.values("service_id").annotate(
+        bookings_30d=Count("id"),
+        bookings_7d=Count("id", filter=Q(created_date__gte=now - timedelta(days=7))),
+        last_booked_at=Max("created_date"),
+    )
+    return {
+        row["service_id"]: {
+            "score": booking_score(row["bookings_7d"], row["bookings_30d"], row["last_booked_at"]),
+            "bookings_7d": row["bookings_7d"],
+            "bookings_30d": row["bookings_30d"],
+            "last_booked_at": row["last_booked_at"],
+        }
+        for row in stats
+    }
+
+
+def touched_services(since, now):
+    """
+    Services whose 7/30-day counts may differ from the last refresh at
+    `since`: new bookings, bookings sliding out of either window, and
+    bookings edited (e.g. cancelled) while still inside the 30-day window.
+    """
+    changed = (
+        Q(created_date__gte=since - COMMIT_LAG)
+        | Q(created_date__gte=since - timedelta(days=30), created_date__lt=now - timedelta(days=30))
+        | Q(created_date__gte=since - timedelta(days=7), created_date__lt=now - timedelta(days=7))
+        | Q(created_date__gte=now - timedelta(days=30), updated_date__gte=since)
+    )
+    bookings = ServiceBook.objects.filter(changed, service__isnull=False, created_date__lt=now)
+    return set(bookings.values_list("service_id", flat=True).distinct())
+
+
+def sync_section(section, desired, now, scope=None):
+    """
+    Make the `section` rows (limited to subcategory ids in `scope`, if given)
+    match `desired`, writing only rows that changed. Returns (written, deleted).
+    """
+    existing = SectionRanking.objects.filter(section=section)
+    if scope is not None:
+        existing = existing.filter(subcategory_id__in=scope)
+    existing = {ranking.subcategory_id: ranking for ranking in existing}
+
+    created, updated = [], []
+    for subcategory_id, fields in desired.items():
+        ranking = existing.get(subcategory_id)
+        if ranking is None:
+            created.append(SectionRanking(section=section, subcategory_id=subcategory_id, refreshed_at=now, **fields))
+        elif any(getattr(ranking, name) != value for name, value in fields.items()):
+            for name, value in fields.items():
+                setattr(ranking, name, value)
+            ranking.refreshed_at = now
+            updated.append(ranking)
+
+    gone = [ranking.id for subcategory_id, ranking in existing.items() if subcategory_id not in desired]
+    SectionRanking.objects.bulk_create(created, batch_size=500)
+    SectionRanking.objects.bulk_update(updated, RANKED_FIELDS + ["refreshed_at"], batch_size=500)
+    SectionRanking.objects.filter(id__in=gone).delete()
+    return len(created) + len(updated), len(gone)
+
+
+def refresh_rankings(full=False):
+    """
+    Recompute the section rankings and return {section: (written, deleted)}.
+
+    Incremental runs only recount the services whose bookings changed since
+    the last refresh. `full` recounts everything, which also picks up changes
+    the incremental scan can't see (e.g. deleted bookings).
+    """
+    now = timezone.now()
+    results = {}
+
+    with transaction.atomic():
+        if full:
+            SectionRanking.objects.all().delete()
+
+        # most booked
+        last_refresh = (
+            SectionRanking.objects.filter(section=SectionRanking.MOST_BOOKED)
+            .aggregate(last=Max("refreshed_at"))["last"]
+        )
+        if last_refresh is None:
+            scope = None
+            desired = booking_rows(now)
+        else:
+            scope = touched_services(last_refresh, now)
+            desired = booking_rows(now, scope)
+        results[SectionRanking.MOST_BOOKED] = sync_section(SectionRanking.MOST_BOOKED, desired, now, scope)
+
+        # new: newest first, for NEW_DAYS after creation
+        recent = SubCategory.objects.filter(created_date__gte=now - timedelta(days=_setting("NEW_DAYS")))
+        desired = {
+            subcategory_id: {"score": created_date.timestamp()}
+            for subcategory_id, created_date in recent.values_list("id", "created_date")
+        }
+        results[SectionRanking.NEW] = sync_section(SectionRanking.NEW, desired, now)
+
+        # premium: admins still pick the services, bookings decide the order
+        premium = SubCategory.objects.filter(section__icontains="premium").values_list("id", flat=True)
+        popular = dict(
+            SectionRanking.objects.filter(section=SectionRanking.MOST_BOOKED, subcategory_id__in=premium)
+            .values_list("subcategory_id", "score")
+        )
+        desired = {subcategory_id: {"score": popular.get(subcategory_id, 0.0)} for subcategory_id in premium}
+        results[SectionRanking.PREMIUM] = sync_section(SectionRanking.PREMIUM, desired, now)
+
+    return results
@@ -0,0 +1,51 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+# Must match the text search config used by the trigger in migration 0006
+SEARCH_CONFIG = "simple"
+MAX_TERMS = 8
+
+
+def search_terms(query):
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+def search_subcategories(queryset, query):
+    """
+    Filter `queryset` (of SubCategory) to rows matching every term of
+    `query` as a word prefix (for type-ahead), annotated with `rank` and
+    ordered best first.
+
+    On Postgres this is a GIN-indexed tsvector match ranked with ts_rank
+    (name > description > faqs). Other databases get a word-prefix regex scan
+    with the same weighting, which is fine for test-sized catalogs.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == "postgresql":
+        # every term as a prefix: "ac rep" -> 'ac:* & rep:*'
+        tsquery = SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config=SEARCH_CONFIG)
+        return (
+            queryset.filter(search_vector=tsquery)
+            .annotate(rank=SearchRank(F("search_vector"), tsquery))
+            .order_by("-rank", "id")
+        )
+
+    matches = Q()
+    rank = Value(0.0)
+    for term in terms:
+        # word-prefix match, like the tsquery prefix above
+        pattern = rf"\b{term}"
+        matches &= Q(name__iregex=pattern) | Q(description__iregex=pattern) | Q(faqs__iregex=pattern)
+        rank = rank + Case(
+            When(name__iregex=pattern, then=Value(1.0)),
+            When(description__iregex=pattern, then=Value(0.4)),
+            default=Value(0.2),
+            output_field=FloatField(),
+        )
+    return queryset.filter(matches).annotate(rank=rank).order_by("-rank", "id")
@@ -1,13 +1,15 @@
 from rest_framework import serializers
 from .models import *
 from customer.models import PendingProfileUpdate, PendingBankDetailUpdate
+from customer.images import ImageVariantsField
 import os
 
 class CategorySerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
     class Meta:
         model = Category
-        fields = ['id', 'category_name', 'image', 'image_url', 'created_date', 'updated_date']
+        fields = ['id', 'category_name', 'image', 'image_url', 'image_variants', 'created_date', 'updated_date']
     
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -33,10 +35,11 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class SubCategoryPublicSerializer(serializers.ModelSerializer):
     cover_image_url = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = SubCategory
-        fields = ['id', 'name', 'cover_image_url']
+        fields = ['id', 'name', 'cover_image_url', 'image_variants']
 
     def get_cover_image_url(self, obj):
         request = self.context.get('request')
@@ -50,14 +53,17 @@ class SubCategoryPublicSerializer(serializers.ModelSerializer):
 class SubCategorySerializer(serializers.ModelSerializer):
     cover_image_url = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = SubCategory
         fields = [
             'id', 'name', 'category', 'description', 'cover_image', 'image',
             'section', 'steps', 'faqs', 'price', 'created_date', 'updated_date',
-            'cover_image_url', 'image_url'
+            'cover_image_url', 'image_url', 'image_variants'
         ]
+        # the column only allows NULL for legacy rows (migration 0008), new services need a price
+        extra_kwargs = {'price': {'required': True, 'allow_null': False}}
 
     def get_cover_image_url(self, obj):
         request = self.context.get('request')
@@ -92,4 +98,28 @@ class SubCategoryItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = SubCategoryItem
         fields = ['id', 'subcategory', 'step_no', 'title', 'description', 'created_date', 'updated_date']
-        read_only_fields = ['id', 'created_date', 'updated_date']
\ No newline at end of file
+        read_only_fields = ['id', 'created_date', 'updated_date']
+
+class CatalogSubCategorySerializer(SubCategorySerializer):
+    items = SubCategoryItemSerializer(many=True, read_only=True)
+
+    class Meta(SubCategorySerializer.Meta):
+        fields = SubCategorySerializer.Meta.fields + ['items']
+
+
+class CatalogSubCategoryPublicSerializer(SubCategoryPublicSerializer):
+    items = SubCategoryItemSerializer(many=True, read_only=True)
+
+    class Meta(SubCategoryPublicSerializer.Meta):
+        fields = SubCategoryPublicSerializer.Meta.fields + ['items']
+
+
+class CatalogCategorySerializer(CategorySerializer):
+    subcategories = serializers.SerializerMethodField()
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['subcategories']
+
+    def get_subcategories(self, obj):
+        serializer_class = self.context.get('subcategory_serializer', CatalogSubCategoryPublicSerializer)
+        return serializer_class(obj.subcategories.all(), many=True, context=self.context).data
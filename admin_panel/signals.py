@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from customer.images import image_variants, variants_stale, VARIANT_FIELDS
+from customer.index_sync import INDEXED_FIELDS, provider_changed, providers_changed
+from customer.models import CustomerProfile
+from .authentication import revoke_claims
+from .catalog_cache import bump_catalog_version
+from .models import Category, SubCategory, SubCategoryItem
+from .user_cache import user_cache
+
+
+@receiver([post_save, post_delete], sender=CustomerProfile)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached auth user whenever the profile row changes."""
+    # after commit, otherwise a concurrent request could cache the old row again;
+    # pk is read now, delete() clears it on the instance
+    user_id = instance.pk
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=CustomerProfile)
+def revoke_stale_token_claims(sender, instance, created, update_fields, **kwargs):
+    """Tokens minted before a role or block change must not be trusted."""
+    # DirtyFieldsMixin passes the changed columns as update_fields, a full save could touch anything
+    if not created and (update_fields is None or {"role", "is_blocked"} & set(update_fields)):
+        revoke_claims([instance.pk])
+
+
+@receiver(post_delete, sender=CustomerProfile)
+def revoke_deleted_user_claims(sender, instance, **kwargs):
+    revoke_claims([instance.pk])
+
+
+@receiver(post_save, sender=CustomerProfile)
+def reindex_provider(sender, instance, created, update_fields, **kwargs):
+    """Re-index the provider for matching when its location, radius, skills or approval change."""
+    if update_fields is None:
+        # a full save of an existing row may have changed the role
+        relevant = instance.role == "service_provider" or not created
+    else:
+        fields = set(update_fields)
+        relevant = bool(INDEXED_FIELDS & fields) and (instance.role == "service_provider" or "role" in fields)
+    if relevant:
+        provider_changed(instance.pk)
+
+
+@receiver(post_delete, sender=CustomerProfile)
+def unindex_provider(sender, instance, **kwargs):
+    if instance.role == "service_provider":
+        provider_changed(instance.pk)
+
+
+@receiver(m2m_changed, sender=CustomerProfile.categories.through)
+def reindex_provider_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        provider_changed(instance.pk)
+    elif pk_set:
+        # subcategory.service_categories.add(...) lists the providers in pk_set
+        provider_changed(*pk_set)
+    else:
+        # subcategory.service_categories.clear() doesn't say which providers it dropped
+        providers_changed()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=SubCategoryItem)
+def invalidate_catalog_cache(sender, **kwargs):
+    # after commit, otherwise a concurrent reader could cache the old rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=CustomerProfile)
+def queue_image_variants(sender, instance, **kwargs):
+    """Resize new uploads in the background; the worker's own save finds nothing stale."""
+    for field_name in VARIANT_FIELDS[sender._meta.label]:
+        if variants_stale(instance, field_name):
+            image_variants.schedule(instance, field_name)
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from .catalog_cache import cached_payload, catalog_version
+from .models import Category, SubCategory, SubCategoryItem
+from .serializers import CatalogCategorySerializer
+
+
+GZIP_LEVEL = 6
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["body", "gzipped", "etag"])
+
+# newest snapshot per variant in this worker, so a hit skips even the cache round trip + unpickle
+_snapshots = {}
+_snapshots_guard = threading.Lock()
+
+
+def catalog_queryset():
+    """Every category with its subcategories and their items, in three queries."""
+    items = SubCategoryItem.objects.order_by("step_no", "id")
+    subcategories = SubCategory.objects.defer("search_vector").order_by("id").prefetch_related(
+        Prefetch("items", queryset=items)
+    )
+    return Category.objects.order_by("id").prefetch_related(Prefetch("subcategories", queryset=subcategories))
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header lets us send gzip: listed with a
+    non-zero q, or, when not listed, covered by a "*" with a non-zero q.
+    "gzip;q=0" is a refusal.
+    """
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def encode_snapshot(payload):
+    body = JSONRenderer().render(payload)
+    gzipped = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    etag = 'W/"{}"'.format(hashlib.md5(body).hexdigest())
+    return CatalogSnapshot(body, gzipped, etag)
+
+
+def build_snapshot(request, subcategory_serializer):
+    context = {"request": request, "subcategory_serializer": subcategory_serializer}
+    serializer = CatalogCategorySerializer(catalog_queryset(), many=True, context=context)
+    return encode_snapshot({"status": 200, "message": "Catalog fetched", "data": serializer.data})
+
+
+def catalog_snapshot(request, subcategory_serializer):
+    """
+    The whole catalog tree as pre-encoded JSON and gzip bytes, built at most
+    once per catalog version (and variant) across all workers.
+    """
+    variant = (request.build_absolute_uri("/"), subcategory_serializer.__name__)
+    version = catalog_version()
+
+    cached = _snapshots.get(variant)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    snapshot = cached_payload("tree", variant, lambda: build_snapshot(request, subcategory_serializer))
+    with _snapshots_guard:
+        _snapshots[variant] = (version, snapshot)
+    return snapshot
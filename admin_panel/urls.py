@@ -9,11 +9,17 @@ urlpatterns = [
     path('subcategories/', SubCategoryView.as_view()),
     path('categories/<int:category_id>/subcategories/', SubCategoryView.as_view()),
     path('subcategories/<int:subcategory_id>/items/', SubCategoryItemView.as_view()),
+    path('services/search/', ServiceSearchView.as_view()),
+    path('catalog/tree/', CatalogTreeView.as_view()),
+    path('sections/<str:section>/', SectionFeedView.as_view()),
     path('items/<int:item_id>/', SubCategoryItemView.as_view()),  
     path("pending-profiles/", PendingProfileApprovalView.as_view(), name="pending-profiles-list"),
     path("pending-profiles/<int:pk>/", PendingProfileApprovalView.as_view(), name="pending-profile-approve"),
     path("pending-bank-details/", PendingBankDetailApprovalView.as_view()),
     path("pending-bank-details/<int:pk>/", PendingBankDetailApprovalView.as_view()),
+    path("auth-cache/stats/", AuthUserCacheStatsView.as_view()),
+    path("write-stats/", ModelWriteStatsView.as_view()),
+    path("user-agent-cache/stats/", UserAgentCacheStatsView.as_view()),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.files import FieldFile
+
+from customer.models import CustomerProfile
+
+
+DEFAULTS = {
+    "LOCAL_TTL": 30,        # seconds an entry lives in this worker's memory
+    "SHARED_TTL": 300,      # seconds an entry lives in the shared cache
+    "MAX_ENTRIES": 10000,   # per-process cap, oldest entries are dropped first
+    "KEY_PREFIX": "auth:user:",
+}
+
+
+def _setting(name):
+    return getattr(settings, "AUTH_USER_CACHE", {}).get(name, DEFAULTS[name])
+
+
+class UserCache:
+    """
+    Two tier cache of CustomerProfile rows used by CustomerJWTAuthentication.
+
+    The local tier is a plain dict guarded by a lock, the shared tier is the
+    default Django cache so every worker benefits from a single DB load.
+    Entries hold raw column values, a fresh model instance is built for each
+    request so views never share (and mutate) the same object.
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+
+    def _key(self, user_id):
+        return f"{_setting('KEY_PREFIX')}{user_id}"
+
+    def get(self, user_id):
+        user_id = int(user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry and entry[0] > now:
+                self.hits_local += 1
+                return self._build(entry[1])
+
+        values = cache.get(self._key(user_id))
+        if values is not None:
+            with self._lock:
+                self.hits_shared += 1
+            self._remember(user_id, values, now)
+            return self._build(values)
+
+        user = CustomerProfile.objects.get(id=user_id)
+        values = self._values(user)
+        cache.set(self._key(user_id), values, _setting("SHARED_TTL"))
+        with self._lock:
+            self.misses += 1
+        self._remember(user_id, values, now)
+        return user
+
+    def invalidate(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._local.pop(user_id, None)
+        cache.delete(self._key(user_id))
+
+    def invalidate_many(self, user_ids):
+        user_ids = [int(user_id) for user_id in user_ids]
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+        cache.delete_many([self._key(user_id) for user_id in user_ids])
+
+    def clear_local(self):
+        """Forget this worker's copies; the shared tier keeps its entries until invalidated or expired."""
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_local + self.hits_shared + self.misses
+            hits = self.hits_local + self.hits_shared
+            return {
+                "hits_local": self.hits_local,
+                "hits_shared": self.hits_shared,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._local),
+            }
+
+    def _remember(self, user_id, values, now):
+        with self._lock:
+            if user_id not in self._local and len(self._local) >= _setting("MAX_ENTRIES"):
+                # dicts keep insertion order, so the first key is the oldest entry
+                self._local.pop(next(iter(self._local)))
+            self._local[user_id] = (now + _setting("LOCAL_TTL"), values)
+
+    @staticmethod
+    def _values(user):
+        values = {}
+        for field in CustomerProfile._meta.concrete_fields:
+            value = getattr(user, field.attname)
+            if isinstance(value, FieldFile):
+                value = value.name
+            values[field.attname] = value
+        return values
+
+    @staticmethod
+    def _build(values):
+        field_names = list(values)
+        return CustomerProfile.from_db("default", field_names, [values[name] for name in field_names])
+
+
+user_cache = UserCache()
@@ -15,6 +15,18 @@ from .models import *
 from .serializers import *
 from rest_framework.permissions import BasePermission
 from service.serializers import BankDetailSerializer
+from .user_cache import user_cache
+from .catalog_cache import cached_payload, catalog_changed_at
+from .conditional import Validators
+from .pagination import paginate, page_key, page_limit
+from .search import search_subcategories
+from decimal import Decimal, InvalidOperation
+from rest_framework.exceptions import ParseError
+from .snapshot import accepts_gzip, catalog_snapshot
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from customer.mixins import write_stats
+from customer.devices import device_cache_stats
 
 class IsRoleAdmin(BasePermission):
     def has_permission(self, request, view):
@@ -24,14 +36,31 @@ class CategoryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, category_id=None):
+        categories = Category.objects.filter(id=category_id) if category_id else Category.objects.all()
+        validators = Validators(
+            categories, request.build_absolute_uri('/'), page_key(request), changed_at=catalog_changed_at()
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return validators.apply(not_modified)
+
+        body, status = cached_payload(
+            "categories", [request.build_absolute_uri('/'), category_id, page_key(request)],
+            lambda: self.build_payload(request, category_id)
+        )
+        return validators.apply(Response(body, status=status))
+
+    def build_payload(self, request, category_id):
         if category_id:
             category = get_object_or_404(Category, id=category_id)
             serializer = CategorySerializer(category, context={'request': request})
-            return Response({"status": 200, "message": "Category retrieved", "data": serializer.data})
+            return {"status": 200, "message": "Category retrieved", "data": serializer.data}, 200
         else:
-            categories = Category.objects.all().order_by('-created_date')
+            categories, next_cursor = paginate(request, Category.objects.all())
             serializer = CategorySerializer(categories, many=True, context={'request': request})
-            return Response({"status": 200, "message": "Categories fetched", "data": serializer.data})
+            return {
+                "status": 200, "message": "Categories fetched", "data": serializer.data, "next_cursor": next_cursor
+            }, 200
 
     def post(self, request):
         print("Request user:", request.user)
@@ -64,8 +93,23 @@ class CategoryView(APIView):
         return Response({"status": 200, "message": "Category deleted", "data": {}})
 
 
+def price_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ParseError(f"{name} must be a number")
+    if not price.is_finite():
+        raise ParseError(f"{name} must be a number")
+    return price
+
+
 class SubCategoryView(APIView):
     permission_classes = [IsAuthenticated]
+    # ?sort= values, each served by keyset pagination on the (category, price, id) index
+    PRICE_SORTS = {"price": ("price", "id"), "-price": ("-price", "-id")}
 
     def get(self, request, category_id=None):
         if not category_id:
@@ -74,21 +118,58 @@ class SubCategoryView(APIView):
                 status=400
             )
 
-        subcategories = SubCategory.objects.filter(category_id=category_id).order_by('-created_date')
-
-        if not subcategories.exists():
-            return Response(
-                {"status": 404, "message": "No subcategories found for this category"},
-                status=404
-            )
-
         if hasattr(request.user, "role") and request.user.role == "admin":
             serializer_class = SubCategorySerializer
         else:
             serializer_class = SubCategoryPublicSerializer
 
+        sort = request.query_params.get("sort")
+        if sort and sort not in self.PRICE_SORTS:
+            return Response(
+                {"status": 400, "message": f"sort must be one of: {', '.join(self.PRICE_SORTS)}"},
+                status=400
+            )
+
+        filters = {"category_id": category_id}
+        min_price = price_param(request, "min_price")
+        max_price = price_param(request, "max_price")
+        if min_price is not None:
+            filters["price__gte"] = min_price
+        if max_price is not None:
+            filters["price__lte"] = max_price
+        if sort:
+            # keyset pagination can't step over NULLs, unpriced legacy rows only show up unsorted
+            filters["price__isnull"] = False
+        ordering = self.PRICE_SORTS[sort] if sort else ("-created_date", "-id")
+        listing = f"{min_price}:{max_price}:{sort}"
+
+        subcategories = SubCategory.objects.filter(**filters)
+        validators = Validators(
+            subcategories,
+            request.build_absolute_uri('/'), serializer_class.__name__, listing, page_key(request),
+            changed_at=catalog_changed_at()
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return validators.apply(not_modified)
+
+        body, status = cached_payload(
+            "subcategories",
+            [request.build_absolute_uri('/'), serializer_class.__name__, category_id, listing, page_key(request)],
+            lambda: self.build_payload(request, subcategories, ordering, serializer_class)
+        )
+        return validators.apply(Response(body, status=status))
+
+    def build_payload(self, request, subcategories, ordering, serializer_class):
+        subcategories, next_cursor = paginate(request, subcategories, ordering)
+
+        if not subcategories and not request.query_params.get("cursor"):
+            return {"status": 404, "message": "No subcategories found for this category"}, 404
+
         serializer = serializer_class(subcategories, many=True, context={'request': request})
-        return Response({"status": 200, "message": "Subcategories fetched", "data": serializer.data})
+        return {
+            "status": 200, "message": "Subcategories fetched", "data": serializer.data, "next_cursor": next_cursor
+        }, 200
 
     def post(self, request):
         if not isinstance(request.user, CustomerProfile) or request.user.role != 'admin':
@@ -120,20 +201,102 @@ class SubCategoryView(APIView):
         return Response({"status": 200, "message": "Subcategory deleted", "data": {}})
 
 
+class ServiceSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Ranked service search with prefix matching, e.g. ?q=ac rep"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"status": 400, "message": "Search query 'q' is required"}, status=400)
+
+        if hasattr(request.user, "role") and request.user.role == "admin":
+            serializer_class = SubCategorySerializer
+            subcategories = SubCategory.objects.all()
+        else:
+            serializer_class = SubCategoryPublicSerializer
+            subcategories = SubCategory.objects.only("id", "name", "cover_image", "image_variants")
+
+        results = search_subcategories(subcategories, query)[:page_limit(request)]
+        serializer = serializer_class(results, many=True, context={'request': request})
+        return Response({"status": 200, "message": "Search results", "data": serializer.data})
+
+
+class SectionFeedView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, section):
+        """Home-screen section (most_booked, new, premium) from the precomputed rankings"""
+        if section not in dict(SectionRanking.SECTION_CHOICES):
+            return Response({"status": 404, "message": "Unknown section"}, status=404)
+
+        if hasattr(request.user, "role") and request.user.role == "admin":
+            serializer_class = SubCategorySerializer
+        else:
+            serializer_class = SubCategoryPublicSerializer
+
+        ids = list(
+            SectionRanking.objects.filter(section=section)
+            .order_by("-score", "subcategory_id")
+            .values_list("subcategory_id", flat=True)[:page_limit(request)]
+        )
+        subcategories = SubCategory.objects.in_bulk(ids)
+        ranked = [subcategories[pk] for pk in ids if pk in subcategories]
+
+        serializer = serializer_class(ranked, many=True, context={'request': request})
+        return Response({"status": 200, "message": "Section fetched", "data": serializer.data})
+
+
+class CatalogTreeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Every category with its subcategories and items, served from a pre-encoded snapshot"""
+        if hasattr(request.user, "role") and request.user.role == "admin":
+            subcategory_serializer = CatalogSubCategorySerializer
+        else:
+            subcategory_serializer = CatalogSubCategoryPublicSerializer
+
+        snapshot = catalog_snapshot(request, subcategory_serializer)
+
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            if accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+                response = HttpResponse(snapshot.gzipped, content_type="application/json")
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(snapshot.body, content_type="application/json")
+            response["Content-Length"] = len(response.content)
+
+        response["ETag"] = snapshot.etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
 class SubCategoryItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     # Get all items for a subcategory (allowed for all users)
     def get(self, request, subcategory_id):
+        validators = Validators(
+            SubCategoryItem.objects.filter(subcategory_id=subcategory_id),
+            changed_at=catalog_changed_at()
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return validators.apply(not_modified)
+
+        body, status = cached_payload("items", [subcategory_id], lambda: self.build_payload(subcategory_id))
+        return validators.apply(Response(body, status=status))
+
+    def build_payload(self, subcategory_id):
         items = SubCategoryItem.objects.filter(subcategory_id=subcategory_id)
         if not items.exists():
-            return Response(
-                {"status": 404, "message": "No items found for this subcategory"},
-                status=404
-            )
+            return {"status": 404, "message": "No items found for this subcategory"}, 404
 
         serializer = SubCategoryItemSerializer(items, many=True)
-        return Response({"status": 200, "message": "Items fetched", "data": serializer.data})
+        return {"status": 200, "message": "Items fetched", "data": serializer.data}, 200
 
     # Create new item inside a subcategory (only admin)
     def post(self, request, subcategory_id):
@@ -228,9 +391,11 @@ class PendingProfileApprovalView(APIView):
 
     def get(self, request):
         """Fetch all pending profile update requests"""
-        pending_requests = PendingProfileUpdate.objects.filter(reviewed=False)
+        pending_requests, next_cursor = paginate(
+            request, PendingProfileUpdate.objects.filter(reviewed=False), ordering=("-created_at", "-id")
+        )
         serializer = PendingProfileUpdateSerializer(pending_requests, many=True)
-        return Response({"status": 200, "data": serializer.data})
+        return Response({"status": 200, "data": serializer.data, "next_cursor": next_cursor})
 
     def patch(self, request, pk):
         """Approve or Reject a pending profile update"""
@@ -285,9 +450,11 @@ class PendingBankDetailApprovalView(APIView):
 
     def get(self, request):
         """Fetch all pending bank detail update requests"""
-        pending = PendingBankDetailUpdate.objects.filter(reviewed=False)
+        pending, next_cursor = paginate(
+            request, PendingBankDetailUpdate.objects.filter(reviewed=False), ordering=("-created_at", "-id")
+        )
         serializer = PendingBankDetailUpdateSerializer(pending, many=True)
-        return Response({"status": 200, "data": serializer.data})
+        return Response({"status": 200, "data": serializer.data, "next_cursor": next_cursor})
 
     def patch(self, request, pk):
         """Approve or reject a pending bank detail update"""
@@ -315,3 +482,28 @@ class PendingBankDetailApprovalView(APIView):
             return Response({"status": 200, "message": "Bank detail update request rejected"})
 
         return Response({"status": 400, "message": "Invalid action"})
+
+
+
+class AuthUserCacheStatsView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        """Hit/miss counters of the auth user cache in this worker"""
+        return Response({"status": 200, "message": "Auth user cache stats", "data": user_cache.stats()})
+
+
+class ModelWriteStatsView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        """Columns and bytes written vs. skipped by dirty-field saves in this worker"""
+        return Response({"status": 200, "message": "Model write stats", "data": write_stats()})
+
+
+class UserAgentCacheStatsView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        """Hit/miss counters of the login user-agent parse cache in this worker"""
+        return Response({"status": 200, "message": "User agent cache stats", "data": device_cache_stats()})
@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import CustomerProfile, Address, BankDetail, PendingProfileUpdate, PendingBankDetailUpdate
+from .models import CustomerProfile, Address, BankDetail, PendingProfileUpdate, PendingBankDetailUpdate, PaymentOrderOutbox
+from django.utils import timezone
 from django.utils.html import format_html
 from .serializers import CustomerProfileSerializer
+from admin_panel.user_cache import user_cache
+from admin_panel.authentication import revoke_claims
+from .index_sync import provider_changed
 
 
 class AddressInline(admin.TabularInline):  
@@ -18,7 +22,7 @@ class CustomerProfileAdmin(admin.ModelAdmin):
     search_fields = ('username', 'email', 'mobile')
     list_filter = ('role', 'is_verified', 'is_blocked', 'is_admin_verified')
     inlines = [AddressInline]
-    readonly_fields = ('otp', 'otp_created_at', 'created_date', 'updated_date')
+    readonly_fields = ('created_date', 'updated_date')
     list_display_links = (
         'id', 'username', 'email', 'mobile', 'role',
         'is_verified', 'is_admin_verified', 'wallet_balance', 'is_blocked', 'approval_status'
@@ -39,16 +43,27 @@ class CustomerProfileAdmin(admin.ModelAdmin):
     approval_status.short_description = "Approval Status"
 
     def approve_service_provider(self, request, queryset):
-        updated = queryset.filter(role="service_provider").update(
+        providers = queryset.filter(role="service_provider")
+        provider_ids = list(providers.values_list("id", flat=True))
+        updated = providers.update(
             is_admin_verified=True, is_verified=True, is_blocked=False
         )
+        # queryset.update() skips post_save, so drop cached auth users by hand
+        user_cache.invalidate_many(provider_ids)
+        revoke_claims(provider_ids)
+        provider_changed(*provider_ids)
         self.message_user(request, f"{updated} service provider(s) approved.")
     approve_service_provider.short_description = "Approve selected service providers"
 
     def reject_service_provider(self, request, queryset):
-        updated = queryset.filter(role="service_provider").update(
+        providers = queryset.filter(role="service_provider")
+        provider_ids = list(providers.values_list("id", flat=True))
+        updated = providers.update(
             is_admin_verified=False, is_verified=False, is_blocked=True
         )
+        user_cache.invalidate_many(provider_ids)
+        revoke_claims(provider_ids)
+        provider_changed(*provider_ids)
         self.message_user(request, f"{updated} service provider(s) rejected.")
     reject_service_provider.short_description = "Reject selected service providers"
 
@@ -132,6 +147,7 @@ class BankDetailAdmin(admin.ModelAdmin):
 @admin.register(PendingBankDetailUpdate)
 class PendingBankDetailUpdateAdmin(admin.ModelAdmin):
     list_display = ("bank_detail", "customer_name", "created_at", "approved", "reviewed")
+    list_select_related = ("bank_detail__customer",)
     actions = ["approve_updates", "reject_updates"]
 
     def customer_name(self, obj):
@@ -154,3 +170,18 @@ class PendingBankDetailUpdateAdmin(admin.ModelAdmin):
     def reject_updates(self, request, queryset):
         queryset.delete()
         self.message_user(request, "❌ Selected pending updates rejected.")
+
+
+@admin.register(PaymentOrderOutbox)
+class PaymentOrderOutboxAdmin(admin.ModelAdmin):
+    list_display = ("payment", "status", "attempts", "next_attempt_at", "last_error", "created_at")
+    list_filter = ("status",)
+    readonly_fields = ("payment", "payload", "attempts", "last_error", "created_at", "updated_at")
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        # picked up by the next dispatch_payment_orders run
+        updated = queryset.exclude(status=PaymentOrderOutbox.SENT).update(
+            status=PaymentOrderOutbox.PENDING, next_attempt_at=timezone.now(), updated_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} payment orders queued for retry.")
@@ -0,0 +1,118 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import SystemLog
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_SIZE": 10000,      # entries queued before log() falls back to a direct INSERT
+    "BATCH_SIZE": 200,      # rows per bulk_create, reaching it wakes the writer early
+    "FLUSH_INTERVAL": 0.5,  # seconds between flushes of a partial batch
+}
+
+
+def _setting(name):
+    return getattr(settings, "SYSTEM_LOG_BUFFER", {}).get(name, DEFAULTS[name])
+
+
+class SystemLogBuffer:
+    """
+    Queues SystemLog rows in memory and writes them with bulk_create from a
+    background thread, so request handlers don't wait on the INSERT. Rows are
+    flushed when a batch fills up, every FLUSH_INTERVAL seconds, and at
+    interpreter shutdown. created_date is the time of the log() call, not of
+    the flush.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def log(self, type, performed_by=None, remark=None):
+        entry = SystemLog(
+            type=type, performed_by_id=getattr(performed_by, "pk", None), remark=remark, created_date=timezone.now(),
+        )
+
+        if not _setting("ENABLED"):
+            entry.save()
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # writer can't keep up, don't drop audit rows
+            entry.save()
+            return
+
+        if self._queue.qsize() >= _setting("BATCH_SIZE"):
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything queued so far. Safe to call from any thread."""
+        if self._queue is None:
+            return
+        with self._flush_lock:
+            while True:
+                batch = self._drain(_setting("BATCH_SIZE"))
+                if not batch:
+                    break
+                self._write(batch)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=_setting("MAX_SIZE"))
+                atexit.register(self.flush)
+            self._thread = threading.Thread(target=self._run, name="system-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(_setting("FLUSH_INTERVAL"))
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("SystemLog flush failed")
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            SystemLog.objects.bulk_create(batch)
+        except Exception:
+            # one bad row (e.g. a deleted performed_by) must not lose the whole batch
+            logger.exception("SystemLog bulk insert failed, writing rows one by one")
+            for entry in batch:
+                try:
+                    entry.save()
+                except Exception:
+                    logger.exception("Dropping SystemLog entry %r", entry.type)
+
+
+system_log = SystemLogBuffer()
@@ -0,0 +1,60 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from user_agents import parse
+
+
+DeviceInfo = namedtuple("DeviceInfo", ["device_type", "os", "browser"])
+
+# Anything longer is junk or an attack, don't let it blow up the cache keys
+MAX_USER_AGENT_LENGTH = 512
+
+DEFAULT_WARMUP_USER_AGENTS = [
+    "okhttp/4.12.0",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+]
+
+
+@lru_cache(maxsize=getattr(settings, "USER_AGENT_CACHE_SIZE", 1024))
+def _detect(user_agent_str):
+    user_agent = parse(user_agent_str)
+    device_type = "PC"
+    if user_agent.is_mobile:
+        device_type = "Mobile"
+    elif user_agent.is_tablet:
+        device_type = "Tablet"
+    elif user_agent.is_bot:
+        device_type = "Bot"
+
+    return DeviceInfo(device_type, user_agent.os.family, user_agent.browser.family)
+
+
+def detect_device(user_agent_str):
+    """Device type, OS and browser for a User-Agent header, memoized per UA string."""
+    return _detect((user_agent_str or "")[:MAX_USER_AGENT_LENGTH])
+
+
+def warm_up(user_agents=None):
+    """
+    Parse the known app/browser UAs once so the first logins after a worker
+    starts don't pay for ua-parser's regex compilation.
+    """
+    if user_agents is None:
+        user_agents = getattr(settings, "USER_AGENT_WARMUP", DEFAULT_WARMUP_USER_AGENTS)
+    for user_agent_str in user_agents:
+        detect_device(user_agent_str)
+
+
+def device_cache_stats():
+    info = _detect.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+    }
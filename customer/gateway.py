@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "CONNECT_TIMEOUT": 3.05,   # seconds
+    "READ_TIMEOUT": 10,
+    "POOL_SIZE": 20,           # keep-alive connections per gateway host
+    "BREAKER_FAILURES": 5,     # consecutive failures that open the circuit
+    "BREAKER_RESET": 30,       # seconds an open circuit fails fast before letting one trial call through
+}
+
+
+def _setting(name):
+    return getattr(settings, "PAYMENT_GATEWAY", {}).get(name, DEFAULTS[name])
+
+
+class GatewayUnavailable(requests.RequestException):
+    """Raised without calling the gateway while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive gateway failures (connection errors, timeouts, 5xx).
+    After BREAKER_FAILURES of them calls fail fast for BREAKER_RESET seconds,
+    then a single trial call decides whether to close the circuit again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= _setting("BREAKER_RESET"):
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return
+        raise GatewayUnavailable("Payment gateway circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Payment gateway circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            reopen = self._trial_running
+            self._trial_running = False
+            if reopen or (self.opened_at is None and self.failures >= _setting("BREAKER_FAILURES")):
+                self.opened_at = time.monotonic()
+                logger.warning("Payment gateway circuit opened after %s failures", self.failures)
+
+    def reset(self):
+        self.record_success()
+
+
+class GatewaySession(requests.Session):
+    """Keep-alive session with default timeouts that reports every call to the breaker."""
+
+    def __init__(self, breaker, base_url):
+        super().__init__()
+        self.breaker = breaker
+        # resolve proxy settings from the environment once instead of on every call
+        self.trust_env = False
+        self.proxies = requests.utils.get_environ_proxies(base_url)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_setting("POOL_SIZE"), max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (_setting("CONNECT_TIMEOUT"), _setting("READ_TIMEOUT")))
+        self.breaker.before_call()
+        failed = True
+        try:
+            response = super().request(method, url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            # every outcome is recorded, an unexpected error too, so a trial call can't leave the circuit half-open
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+
+class GatewayClient(razorpay.Client):
+    """razorpay.Client that looks up its own package version (for User-Agent) once rather than per request."""
+
+    _version = None
+
+    def _get_version(self):
+        if self._version is None:
+            self._version = super()._get_version()
+        return self._version
+
+
+breaker = CircuitBreaker()
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide razorpay.Client. It is rebuilt only when the gateway
+    settings change (e.g. under override_settings).
+    """
+    global _client, _client_key
+    key = (settings.RAZORPAY_BASE_URL, settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    client = _client
+    if client is not None and _client_key == key:
+        return client
+    with _client_lock:
+        if _client is None or _client_key != key:
+            if _client is not None:
+                _client.session.close()
+            _client = GatewayClient(
+                session=GatewaySession(breaker, settings.RAZORPAY_BASE_URL),
+                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                base_url=settings.RAZORPAY_BASE_URL,
+            )
+            _client_key = key
+            breaker.reset()
+        return _client
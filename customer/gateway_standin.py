@@ -0,0 +1,230 @@
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+def payment_signature(order_id, payment_id, key_secret):
+    """The razorpay_signature Checkout hands to the app for a successful payment."""
+    message = f"{order_id}|{payment_id}".encode()
+    return hmac.new(key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:14]}"
+
+
+class StandInGateway:
+    """
+    A local HTTP stand-in for the parts of the Razorpay API this project uses,
+    for load tests and offline development. Orders and payments live in
+    memory. Every /v1 call waits `latency` (+/- `jitter`) seconds and fails
+    with a 503 at `error_rate`. With `webhook_url` set, every payment is also
+    delivered there as a signed payment.captured / payment.failed event.
+
+        POST /v1/orders                        create an order
+        GET  /v1/orders?receipt=&count=&skip=  list orders
+        GET  /v1/orders/<id>                   fetch an order
+        GET  /v1/orders/<id>/payments          payments made against an order
+        GET  /v1/payments/<id>                 fetch a payment
+        POST /standin/orders/<id>/pay          pay an order as the Checkout form would, returns the
+                                               razorpay_order_id/payment_id/signature triple
+        GET  /standin/stats                    request counts per route
+    """
+
+    def __init__(self, key_secret, latency=0.0, jitter=0.0, error_rate=0.0, host="127.0.0.1", port=0,
+                 webhook_url=None, webhook_secret=None):
+        self.key_secret = key_secret
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.orders = {}
+        self.payments = {}
+        self.payments_by_order = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gateway-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # API
+
+    def create_order(self, body):
+        order = {
+            "id": _new_id("order"), "entity": "order", "status": "created", "attempts": 0,
+            "amount": body.get("amount"), "amount_paid": 0, "amount_due": body.get("amount"),
+            "currency": body.get("currency", "INR"), "receipt": body.get("receipt"),
+            "notes": body.get("notes", []), "created_at": int(time.time()),
+        }
+        with self.lock:
+            self.orders[order["id"]] = order
+        return 200, order
+
+    def list_orders(self, query):
+        receipt = query.get("receipt")
+        count = int(query.get("count", 10))
+        skip = int(query.get("skip", 0))
+        with self.lock:
+            orders = [order for order in self.orders.values() if receipt is None or order["receipt"] == receipt]
+        items = sorted(orders, key=lambda order: order["created_at"], reverse=True)[skip:skip + count]
+        return 200, {"entity": "collection", "count": len(items), "items": items}
+
+    def fetch_order(self, order_id):
+        order = self.orders.get(order_id)
+        return (200, order) if order else _not_found("order")
+
+    def order_payments(self, order_id):
+        if order_id not in self.orders:
+            return _not_found("order")
+        items = self.payments_by_order.get(order_id, [])
+        return 200, {"entity": "collection", "count": len(items), "items": items}
+
+    def fetch_payment(self, payment_id):
+        payment = self.payments.get(payment_id)
+        return (200, payment) if payment else _not_found("payment")
+
+    def pay(self, order_id, body):
+        status = body.get("status", "captured")
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                return _not_found("order")
+            payment = {
+                "id": _new_id("pay"), "entity": "payment", "amount": order["amount"], "currency": order["currency"],
+                "status": status, "order_id": order_id, "method": body.get("method", "upi"),
+                "captured": status == "captured", "invoice_id": None, "created_at": int(time.time()),
+            }
+            self.payments[payment["id"]] = payment
+            self.payments_by_order.setdefault(order_id, []).append(payment)
+            order["attempts"] += 1
+            if status == "captured":
+                order.update(status="paid", amount_paid=order["amount"], amount_due=0)
+            else:
+                order["status"] = "attempted"
+        if self.webhook_url:
+            threading.Thread(target=self.send_webhook, args=(f"payment.{status}", payment), daemon=True).start()
+        return 200, {
+            "razorpay_order_id": order_id,
+            "razorpay_payment_id": payment["id"],
+            "razorpay_signature": payment_signature(order_id, payment["id"], self.key_secret),
+        }
+
+    def send_webhook(self, event, payment):
+        body = json.dumps({
+            "entity": "event", "account_id": "acc_standin", "event": event, "contains": ["payment"],
+            "payload": {"payment": {"entity": payment}}, "created_at": int(time.time()),
+        }).encode()
+        signature = hmac.new((self.webhook_secret or "").encode(), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(self.webhook_url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "X-Razorpay-Signature": signature,
+            "X-Razorpay-Event-Id": _new_id("evt"),
+        })
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError as exc:
+            with self.lock:
+                self.stats["webhook errors"] = self.stats.get("webhook errors", 0) + 1
+            logger.warning("Webhook delivery to %s failed: %s", self.webhook_url, exc)
+
+
+def _not_found(entity):
+    return 400, {"error": {"code": "BAD_REQUEST_ERROR", "description": f"The id provided does not exist ({entity})"}}
+
+
+ROUTES = [
+    ("POST", re.compile(r"^/v1/orders$"), lambda gw, match, query, body: gw.create_order(body)),
+    ("GET", re.compile(r"^/v1/orders$"), lambda gw, match, query, body: gw.list_orders(query)),
+    ("GET", re.compile(r"^/v1/orders/(?P<id>[\w-]+)$"), lambda gw, match, query, body: gw.fetch_order(match["id"])),
+    ("GET", re.compile(r"^/v1/orders/(?P<id>[\w-]+)/payments$"),
+     lambda gw, match, query, body: gw.order_payments(match["id"])),
+    ("GET", re.compile(r"^/v1/payments/(?P<id>[\w-]+)$"),
+     lambda gw, match, query, body: gw.fetch_payment(match["id"])),
+    ("POST", re.compile(r"^/standin/orders/(?P<id>[\w-]+)/pay$"),
+     lambda gw, match, query, body: gw.pay(match["id"], body)),
+    ("GET", re.compile(r"^/standin/stats$"), lambda gw, match, query, body: (200, dict(gw.stats))),
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real gateway
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        gateway = self.server.gateway
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        for route_method, pattern, view in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Unknown URL"}})
+
+        name = f"{method} " + re.sub(r"\(\?P<(\w+)>[^)]*\)", r"<\1>", pattern.pattern.strip("^$"))
+        with gateway.lock:
+            gateway.stats[name] = gateway.stats.get(name, 0) + 1
+
+        if url.path.startswith("/v1/"):
+            delay = gateway.latency + random.uniform(-gateway.jitter, gateway.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            if gateway.error_rate and random.random() < gateway.error_rate:
+                return self._reply(503, {"error": {"code": "SERVER_ERROR", "description": "Stand-in failure"}})
+
+        self._reply(*view(gateway, match, query, body))
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# responses that ask the client to try again are not stored, so the retry actually runs
+RETRY_STATUSES = {408, 429, 503, 504}
+
+DEFAULTS = {
+    "TTL": 86400,         # seconds a finished response is replayed for
+    "WAIT_TIMEOUT": 15,   # seconds a duplicate waits for the in-flight request before answering 409
+    "LOCK_TIMEOUT": 60,   # seconds after which an unfinished request is assumed dead and may be re-run
+}
+
+
+def _setting(name):
+    return getattr(settings, "IDEMPOTENCY", {}).get(name, DEFAULTS[name])
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _acquire(user_id, key, fingerprint, now):
+    """
+    Claim (user, key) for this request. Returns (record, owned): owned means
+    the caller must run the view. record is None if the row vanished in
+    between, in which case the caller should simply try again.
+    """
+    lock = now + timedelta(seconds=_setting("LOCK_TIMEOUT"))
+    expires = now + timedelta(seconds=_setting("TTL"))
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user_id=user_id, key=key, fingerprint=fingerprint, locked_until=lock, expires_at=expires,
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if record is None:
+        return None, False
+    stale = record.status == IdempotencyKey.IN_PROGRESS and record.locked_until <= now
+    if record.expires_at <= now or stale:
+        # only one of several waiters wins this conditional UPDATE
+        taken = IdempotencyKey.objects.filter(
+            id=record.id, status=record.status, locked_until=record.locked_until,
+        ).update(
+            status=IdempotencyKey.IN_PROGRESS, fingerprint=fingerprint, response_status=None, response_body=None,
+            locked_until=lock, expires_at=expires,
+        )
+        if not taken:
+            return None, False
+        record.status, record.fingerprint, record.locked_until = IdempotencyKey.IN_PROGRESS, fingerprint, lock
+        return record, True
+    return record, False
+
+
+def _replay(record):
+    return Response(record.response_body, status=record.response_status, headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(handler):
+    """
+    Make an APIView handler safe to retry. A request carrying an
+    Idempotency-Key header runs once per (user, key) and its response is
+    stored for TTL seconds. Repeats get the stored response back, and a
+    repeat that arrives while the first is still running waits for it.
+    Exceptions and RETRY_STATUSES responses are not stored, so those can be retried.
+    Requests without the header are handled as before.
+    """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user or not request.user.is_authenticated:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"status": 400, "message": f"{HEADER} is too long"}, status=400)
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + _setting("WAIT_TIMEOUT")
+        delay = 0.05
+        while True:
+            record, owned = _acquire(request.user.pk, key, fingerprint, timezone.now())
+            if owned:
+                break
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    return Response({
+                        "status": 422,
+                        "message": f"{HEADER} was already used for a different request"
+                    }, status=422)
+                if record.status == IdempotencyKey.DONE:
+                    return _replay(record)
+            if time.monotonic() >= deadline:
+                return Response({
+                    "status": 409,
+                    "message": "A request with this Idempotency-Key is still being processed"
+                }, status=409)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        # still ours only while our lease is on the row: past LOCK_TIMEOUT another request may have taken it over
+        lease = IdempotencyKey.objects.filter(
+            id=record.id, status=IdempotencyKey.IN_PROGRESS, locked_until=record.locked_until,
+        )
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except Exception:
+            lease.delete()
+            raise
+
+        if response.status_code in RETRY_STATUSES:
+            lease.delete()
+            return response
+
+        body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+        if not lease.update(status=IdempotencyKey.DONE, response_status=response.status_code, response_body=body):
+            logger.warning(
+                "%s %r of user #%s outlived its lease and was taken over, its response was not stored",
+                HEADER, key, request.user.pk,
+            )
+        return response
+
+    return wrapper
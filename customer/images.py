@@ -0,0 +1,229 @@
+import atexit
+import io
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,         # generate in a background thread; False generates inline after commit
+    "WIDTHS": [160, 320, 640],
+    "FORMATS": ["webp", "jpeg"],
+    "QUALITY": 80,
+    "MAX_QUEUE": 1000,
+}
+
+# image fields that get resized variants, per model
+VARIANT_FIELDS = {
+    "admin_panel.Category": ["image"],
+    "admin_panel.SubCategory": ["cover_image", "image"],
+    "customer.CustomerProfile": ["profile_image"],
+}
+
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def _setting(name):
+    return getattr(settings, "IMAGE_VARIANTS", {}).get(name, DEFAULTS[name])
+
+
+def variants_stale(instance, field_name):
+    """True if the variants recorded for `field_name` don't belong to the current file."""
+    current = getattr(instance, field_name).name or None
+    recorded = (instance.image_variants or {}).get(field_name, {}).get("source")
+    return current != recorded
+
+
+def _render(image, width, fmt):
+    from PIL import Image
+
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.LANCZOS)
+    if fmt == "jpeg" and resized.mode != "RGB":
+        # JPEG has no alpha, flatten onto white instead of letting transparent areas go black
+        background = Image.new("RGB", resized.size, (255, 255, 255))
+        rgba = resized.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        resized = background
+    buffer = io.BytesIO()
+    resized.save(buffer, PIL_FORMATS[fmt], quality=_setting("QUALITY"), optimize=fmt == "jpeg")
+    return buffer.getvalue()
+
+
+def render_variants(field_file):
+    """
+    Resize `field_file` to each configured width (never upscaling) in each
+    format, saving the results next to the original. Returns the variants
+    entry; files Pillow can't read (e.g. SVG) get an entry with no widths so
+    they aren't retried on every save.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with field_file.storage.open(field_file.name, "rb") as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning("Skipping image variants for %s, not a readable image", field_file.name)
+        return {"source": field_file.name, "widths": {}}
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    stem, _ = os.path.splitext(field_file.name)
+    widths = {}
+    for width in sorted(_setting("WIDTHS")):
+        if width >= image.width:
+            break
+        widths[str(width)] = {
+            fmt: field_file.storage.save(f"{stem}_{width}w.{EXTENSIONS[fmt]}", ContentFile(_render(image, width, fmt)))
+            for fmt in _setting("FORMATS")
+        }
+    return {"source": field_file.name, "width": image.width, "widths": widths}
+
+
+def _delete_files(storage, entry):
+    for formats in (entry or {}).get("widths", {}).values():
+        for name in formats.values():
+            try:
+                storage.delete(name)
+            except OSError:
+                logger.warning("Could not delete image variant %s", name)
+
+
+def generate_variants(model, pk, field_name, force=False):
+    """Create (or drop) the variants of one image field and record them on the row."""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not (force or variants_stale(instance, field_name)):
+        return
+    field_file = getattr(instance, field_name)
+    entry = render_variants(field_file) if field_file else None
+
+    with transaction.atomic():
+        locked = model.objects.select_for_update().filter(pk=pk).first()
+        if locked is None or getattr(locked, field_name).name != field_file.name:
+            # deleted or re-uploaded while we were resizing, the newer job wins
+            _delete_files(field_file.storage, entry)
+            return
+        variants = dict(locked.image_variants or {})
+        previous = variants.pop(field_name, None)
+        if entry is not None:
+            variants[field_name] = entry
+        locked.image_variants = variants
+        # a normal save so post_save listeners (catalog version, user cache) see the new URLs
+        locked.save(update_fields=["image_variants", "updated_date"])
+
+    # storage.save() never overwrites, so the old files are always distinct from the new ones
+    _delete_files(field_file.storage, previous)
+
+
+class ImageVariantWorker:
+    """
+    Generates image variants off the request path. Jobs are queued after the
+    upload commits and processed one at a time by a daemon thread; a job that
+    is already queued is not queued twice.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, instance, field_name):
+        job = (type(instance), instance.pk, field_name)
+        transaction.on_commit(lambda: self._submit(job))
+
+    def _submit(self, job):
+        if not _setting("ENABLED"):
+            self._process(job)
+            return
+
+        with self._pending_lock:
+            if job in self._pending:
+                return
+            self._pending.add(job)
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.discard(job)
+            logger.warning("Image variant queue full, skipping %s #%s %s", job[0].__name__, job[1], job[2])
+
+    def join(self):
+        """Block until every queued job is done."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=_setting("MAX_QUEUE"))
+                atexit.register(self.join)
+            self._thread = threading.Thread(target=self._run, name="image-variant-worker", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(job)
+            close_old_connections()
+            try:
+                self._process(job)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job):
+        model, pk, field_name = job
+        try:
+            generate_variants(model, pk, field_name)
+        except Exception:
+            logger.exception("Image variants failed for %s #%s %s", model.__name__, pk, field_name)
+
+
+image_variants = ImageVariantWorker()
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only {field: {width: {format: url}}} for a model's `image_variants`,
+    so clients can pick the smallest image that fits instead of the upload.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        request = self.context.get("request")
+        urls = {}
+        for field_name, entry in (instance.image_variants or {}).items():
+            # from the field, not the file, so a deferred image column isn't loaded per row
+            storage = instance._meta.get_field(field_name).storage
+            urls[field_name] = {
+                width: {
+                    fmt: request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+                    for fmt, name in formats.items()
+                }
+                for width, formats in entry.get("widths", {}).items()
+            }
+        return urls
@@ -0,0 +1,130 @@
+import abc
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CustomerProfile
+
+
+VERSION_KEY = "matching:version"
+CHANGE_KEY = "matching:change:{}"
+REBUILD_ALL = 0  # logged instead of a provider id to make every worker start over
+
+DEFAULTS = {
+    "REBUILD_INTERVAL": 3600,    # seconds before a worker reloads an index from scratch anyway
+    "MAX_CHANGES": 500,          # a worker further behind than this reloads instead of replaying
+    "CHANGE_TTL": 3600,          # seconds a change stays in the shared log
+}
+
+# saving any of these on a profile can move it into, out of or around an index
+INDEXED_FIELDS = {
+    "role", "is_admin_verified", "is_blocked", "latitude", "longitude", "service_km", "service_skill",
+}
+
+
+def _setting(name):
+    return getattr(settings, "PROVIDER_MATCHING", {}).get(name, DEFAULTS[name])
+
+
+def matchable_providers():
+    """Providers that may be assigned work: approved, not blocked and with a location."""
+    return CustomerProfile.objects.filter(
+        role="service_provider", is_admin_verified=True, is_blocked=False,
+        latitude__isnull=False, longitude__isnull=False,
+    )
+
+
+class SyncedIndex(abc.ABC):
+    """
+    An in-memory index over matchable providers that each worker keeps for
+    itself. A change to a provider (see provider_changed) bumps a shared
+    version in the cache and logs the provider id under it; before each
+    lookup, sync() replays the ids logged since this copy's version through
+    replay(), and calls rebuild() instead when the log has a gap, the copy
+    has fallen too far behind or REBUILD_INTERVAL has passed.
+
+    The version and the log must be in a cache every worker shares (see
+    CACHES in settings). With a per-process one a worker only sees its own
+    changes and serves the rest from its last rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self.rebuilds = 0
+        self.replayed = 0
+
+    @abc.abstractmethod
+    def rebuild(self):
+        """Reload every provider."""
+
+    @abc.abstractmethod
+    def replay(self, provider_ids):
+        """Reload just these providers; the ones no longer matchable drop out."""
+
+    def _rebuild(self, version):
+        self.rebuild()
+        self._version = version
+        self._built_at = time.monotonic()
+        self.rebuilds += 1
+
+    def sync(self):
+        """Bring this worker's copy up to the shared version."""
+        shared = current_version()
+        if shared == self._version and time.monotonic() - self._built_at < _setting("REBUILD_INTERVAL"):
+            return
+        with self._lock:
+            if self._version is None or time.monotonic() - self._built_at >= _setting("REBUILD_INTERVAL"):
+                return self._rebuild(shared)
+            if shared == self._version:
+                return
+            behind = shared - self._version
+            if behind < 0 or behind > _setting("MAX_CHANGES"):
+                return self._rebuild(shared)
+            keys = [CHANGE_KEY.format(version) for version in range(self._version + 1, shared + 1)]
+            logged = cache.get_many(keys)
+            if len(logged) != len(keys) or REBUILD_ALL in logged.values():
+                # expired, a writer between incr and set, or providers_changed(); either way start over
+                return self._rebuild(shared)
+            provider_ids = sorted(set(logged.values()))
+            self.replay(provider_ids)
+            self._version = shared
+            self.replayed += len(provider_ids)
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock, not 0, so a lost version key can't match a worker's old one
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _log_changes(provider_ids):
+    for provider_id in provider_ids:
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            current_version()
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), provider_id, _setting("CHANGE_TTL"))
+
+
+def provider_changed(*provider_ids):
+    """Queue providers for re-indexing in every worker once the current transaction commits."""
+    if provider_ids:
+        transaction.on_commit(lambda: _log_changes(provider_ids))
+
+
+def providers_changed():
+    """Make every worker rebuild its indexes once the current transaction commits."""
+    transaction.on_commit(lambda: _log_changes([REBUILD_ALL]))
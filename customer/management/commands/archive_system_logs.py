@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from customer.models import SystemLog
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return (value + timedelta(days=32)).replace(day=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive SystemLog rows month by month to gzipped JSONL files and delete them. "
+        "Only whole months that ended more than --older-than-days ago are touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.SYSTEM_LOG_RETENTION_DAYS)
+        parser.add_argument("--output-dir", default=str(settings.SYSTEM_LOG_ARCHIVE_DIR))
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = month_start(timezone.now() - timedelta(days=options["older_than_days"]))
+        output_dir = Path(options["output_dir"])
+        chunk_size = options["chunk_size"]
+
+        oldest = SystemLog.objects.order_by("created_date").values_list("created_date", flat=True).first()
+        if oldest is None or oldest >= cutoff:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        start = month_start(oldest)
+        while start < cutoff:
+            end = next_month(start)
+            month = SystemLog.objects.filter(created_date__gte=start, created_date__lt=end)
+
+            if options["dry_run"]:
+                count = month.count()
+                if count:
+                    self.stdout.write(f"{start:%Y-%m}: {count} rows would be archived")
+            else:
+                archived = self.archive_month(month, output_dir, start, chunk_size)
+                if archived:
+                    deleted = self.delete_month(month, chunk_size)
+                    self.stdout.write(self.style.SUCCESS(f"{start:%Y-%m}: archived {archived}, deleted {deleted}"))
+            start = end
+
+    def archive_month(self, month, output_dir, start, chunk_size):
+        path = output_dir / f"system_log_{start:%Y_%m}.jsonl.gz"
+        if path.exists():
+            # an earlier run already archived this month, keep both files
+            path = output_dir / f"system_log_{start:%Y_%m}_{datetime.now():%Y%m%d%H%M%S}.jsonl.gz"
+        partial = path.with_suffix(".partial")
+
+        rows = (
+            month.order_by("created_date", "id")
+            .values("id", "type", "performed_by_id", "remark", "created_date", "updated_date")
+            .iterator(chunk_size=chunk_size)
+        )
+        count = 0
+        with gzip.open(partial, "wt", encoding="utf-8") as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+                archive.write("\n")
+                count += 1
+
+        if count:
+            os.replace(partial, path)
+        else:
+            partial.unlink()
+        return count
+
+    def delete_month(self, month, chunk_size):
+        # small batches keep each DELETE short instead of one huge transaction
+        deleted = 0
+        while True:
+            ids = list(month.order_by("id").values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            deleted += SystemLog.objects.filter(id__in=ids).delete()[0]
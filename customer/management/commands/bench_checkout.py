@@ -0,0 +1,144 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from admin_panel.authentication import tokens_for_user
+from admin_panel.models import Category, SubCategory
+from customer.gateway_standin import StandInGateway
+from customer.models import Address, Cart, CustomerProfile, ServiceBook, ServiceCart
+from customer.otp import get_otp_store
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark checkout against the local gateway stand-in on a throwaway test database: "
+        "latency percentiles and how many DB connections sit inside a transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--latency", type=float, default=300, help="Gateway latency in ms")
+        parser.add_argument("--compare", action="store_true",
+                            help="Also run with each checkout wrapped in one transaction, like before the outbox")
+
+    def handle(self, *args, **options):
+        gateway = StandInGateway(key_secret="bench", latency=options["latency"] / 1000).start()
+
+        modes = [("outbox", False)] + ([("single transaction", True)] if options["compare"] else [])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(SYSTEM_LOG_BUFFER={"ENABLED": False}, IMAGE_VARIANTS={"ENABLED": False},
+                                   RAZORPAY_BASE_URL=gateway.url, RAZORPAY_KEY_ID="bench", RAZORPAY_KEY_SECRET="bench"):
+                for run, (label, wrap) in enumerate(modes, 1):
+                    checkouts = self.seed(run, options["requests"])
+                    self.report(label, *self.run(checkouts, options["concurrency"], wrap))
+        finally:
+            gateway.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, run, count):
+        category = Category.objects.create(category_name=f"Bench {run}")
+        services = SubCategory.objects.bulk_create([
+            SubCategory(name=f"Bench service {run}-{i}", category=category, description="d", section="new",
+                        steps="s", faqs="f", price=Decimal(100 + i))
+            for i in range(3)
+        ])
+        users = CustomerProfile.objects.bulk_create([
+            CustomerProfile(username=f"bench{run}-{i}", email=f"bench{run}-{i}@example.com",
+                            mobile=f"7{run:02d}{i:07d}", role="user", is_verified=True)
+            for i in range(count)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        ServiceCart.objects.bulk_create([
+            ServiceCart(cart=cart, service=service, price=service.price, total_price=service.price)
+            for cart in carts for service in services
+        ])
+        Address.objects.bulk_create([
+            Address(user=user, label="Home", address="1 Main St", city="City", state="State", pincode="1",
+                    is_default=True)
+            for user in users
+        ])
+        bookings = ServiceBook.objects.bulk_create([
+            ServiceBook(user=user, otp_generated_at=timezone.now(), status="pending") for user in users
+        ])
+        store = get_otp_store()
+        return [
+            (str(tokens_for_user(user).access_token), booking.id, store.issue("payment", booking.id))
+            for user, booking in zip(users, bookings)
+        ]
+
+    def run(self, checkouts, concurrency, wrap):
+        worker_connections = []
+        register = threading.Lock()
+        local = threading.local()
+
+        def checkout(job):
+            token, booking_id, otp = job
+            if not hasattr(local, "client"):
+                local.client = APIClient()
+                with register:
+                    worker_connections.append(connections["default"])
+            local.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            started = time.perf_counter()
+            if wrap:
+                with transaction.atomic():
+                    response = local.client.post("/api/customer/payment/checkout/",
+                                                 {"otp": otp, "booking_id": booking_id}, format="json")
+            else:
+                response = local.client.post("/api/customer/payment/checkout/",
+                                             {"otp": otp, "booking_id": booking_id}, format="json")
+            return time.perf_counter() - started, response.status_code
+
+        # sample how many worker connections are inside a transaction
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                samples.append(sum(1 for conn in list(worker_connections) if conn.in_atomic_block))
+                time.sleep(0.001)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(checkout, checkouts))
+        elapsed = time.perf_counter() - started
+        done.set()
+        sampler.join()
+        for conn in worker_connections:
+            # the test database can't be dropped while worker threads hold connections to it
+            conn.inc_thread_sharing()
+            conn.close()
+        return results, samples, elapsed
+
+    def report(self, label, results, samples, elapsed):
+        latencies = [seconds * 1000 for seconds, _ in results]
+        statuses = {}
+        for _, status in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        busy = statistics.mean(samples) if samples else 0.0
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f"  requests      {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s), "
+                          f"statuses {statuses}")
+        self.stdout.write(f"  latency ms    p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+                          f"p99 {percentile(latencies, 99):.1f}  max {max(latencies):.1f}")
+        self.stdout.write(f"  connections in a transaction: mean {busy:.2f}, peak {max(samples, default=0)}, "
+                          f"~{busy * elapsed * 1000 / len(results):.1f} ms per checkout")
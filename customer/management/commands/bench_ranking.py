@@ -0,0 +1,77 @@
+import math
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from customer.ranking import EARTH_RADIUS_KM, ProviderArrays, _setting
+
+
+def naive_rank(providers, latitude, longitude, k):
+    """The same ranking as ProviderArrays.rank(), one provider at a time in plain Python."""
+    scale, experience_cap, load_cap = _setting("DISTANCE_SCALE_KM"), _setting("EXPERIENCE_CAP"), _setting("LOAD_CAP")
+    weights = _setting("DISTANCE_WEIGHT"), _setting("EXPERIENCE_WEIGHT"), _setting("LOAD_WEIGHT")
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    ranked = []
+    for provider_id, provider_latitude, provider_longitude, radius_km, experience, load in providers:
+        lat2, lon2 = math.radians(provider_latitude), math.radians(provider_longitude)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+        if distance > radius_km:
+            continue
+        score = (
+            weights[0] * scale / (scale + distance)
+            + weights[1] * min(experience, experience_cap) / experience_cap
+            - weights[2] * min(load, load_cap) / load_cap
+        )
+        ranked.append((-score, distance, provider_id))
+    ranked.sort()
+    return [provider_id for _, _, provider_id in ranked[:k]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark provider ranking: one vectorized NumPy pass (customer/ranking.py) against a plain "
+        "Python loop, on synthetic providers spread over India. No database needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--queries", type=int, default=5, help="Ranked locations per size")
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.stdout.write(f"{'providers':>10} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}  same top {options['top']}")
+        for size in options["sizes"]:
+            providers = [
+                (i, rng.uniform(8, 35), rng.uniform(68, 97), rng.choice([5.0, 10.0, 20.0, 50.0, 200.0]),
+                 rng.randint(0, 15), rng.randint(0, 6))
+                for i in range(1, size + 1)
+            ]
+            started = time.perf_counter()
+            arrays = ProviderArrays.from_rows(providers)
+            packed = time.perf_counter() - started
+            queries = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(options["queries"])]
+
+            loop_seconds = numpy_seconds = 0.0
+            agree = 0
+            for latitude, longitude in queries:
+                started = time.perf_counter()
+                expected = naive_rank(providers, latitude, longitude, options["top"])
+                loop_seconds += time.perf_counter() - started
+
+                started = time.perf_counter()
+                ranked = arrays.rank(latitude, longitude, options["top"])
+                numpy_seconds += time.perf_counter() - started
+                agree += [provider_id for provider_id, _, _ in ranked] == expected
+
+            loop_ms = loop_seconds / len(queries) * 1000
+            numpy_ms = numpy_seconds / len(queries) * 1000
+            self.stdout.write(
+                f"{size:>10} {loop_ms:>10.2f} {numpy_ms:>10.2f} {loop_ms / numpy_ms:>7.0f}x  "
+                f"{agree}/{len(queries)}  (packing took {packed * 1000:.0f} ms, "
+                f"{sum(array.nbytes for array in vars(arrays).values() if isinstance(array, np.ndarray)) / 2**20:.1f} MiB)"
+            )
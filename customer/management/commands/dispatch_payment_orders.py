@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from customer.payments import dispatch_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the gateway orders still pending in the payment outbox: checkouts whose "
+        "inline attempt failed or was interrupted. Run from cron, or with --loop as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Rows per pass")
+        parser.add_argument("--loop", type=float, metavar="SECONDS",
+                            help="Keep running, sleeping this long between passes that find nothing due")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            counts = dispatch_due(options["limit"])
+            if any(counts.values()):
+                self.stdout.write(", ".join(f"{status}: {count}" for status, count in counts.items()))
+            if options["loop"] is None:
+                break
+            if sum(counts.values()) < options["limit"]:
+                time.sleep(options["loop"])
@@ -0,0 +1,29 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from customer.images import VARIANT_FIELDS, generate_variants, variants_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate resized image variants for uploads that don't have them yet, "
+        "e.g. images uploaded before variants existed. Runs synchronously."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that are already up to date")
+        parser.add_argument("--model", choices=sorted(VARIANT_FIELDS), help="Only process this model")
+
+    def handle(self, *args, **options):
+        labels = [options["model"]] if options["model"] else sorted(VARIANT_FIELDS)
+        for label in labels:
+            model = apps.get_model(label)
+            fields = VARIANT_FIELDS[label]
+            done = 0
+            rows = model.objects.only("pk", "image_variants", *fields).order_by("pk")
+            for instance in rows.iterator(chunk_size=500):
+                for field_name in fields:
+                    if options["force"] or variants_stale(instance, field_name):
+                        generate_variants(model, instance.pk, field_name, force=options["force"])
+                        done += 1
+            self.stdout.write(self.style.SUCCESS(f"{label}: processed {done} image fields"))
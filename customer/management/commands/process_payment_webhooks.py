@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from customer.webhooks import process_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply stored gateway webhook events to Payment rows in batches. "
+        "Run from cron, or with --loop as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--loop", type=float, metavar="SECONDS",
+                            help="Keep running, sleeping this long whenever the queue is empty")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            close_old_connections()
+            handled = process_batch(options["batch_size"])
+            total += handled
+            if handled:
+                self.stdout.write(f"Processed {handled} webhook events.")
+            if handled < options["batch_size"]:
+                if options["loop"] is None:
+                    break
+                time.sleep(options["loop"])
+        if options["loop"] is None:
+            self.stdout.write(f"Done, {total} events processed.")
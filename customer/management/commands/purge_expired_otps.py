@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from customer.otp import DatabaseOTPStore
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTP rows left by DatabaseOTPStore, e.g. payment OTPs of abandoned bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # the table is purged even when OTP_STORE now points at the cache, rows from before the switch still expire
+        total = DatabaseOTPStore().purge_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(f"Deleted {total} expired OTPs.")
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from customer.reconciliation import Reconciler, pending_chunks
+
+
+DEFAULTS = {
+    "MIN_AGE": 1800,
+    "CHUNK_SIZE": 1000,
+    "WORKERS": 16,
+    "CHECKPOINT_FILE": settings.BASE_DIR / "archives" / "checkpoints" / "reconcile_payments.json",
+}
+
+
+def _setting(name):
+    return getattr(settings, "PAYMENT_RECONCILIATION", {}).get(name, DEFAULTS[name])
+
+
+class Command(BaseCommand):
+    help = (
+        "Check pending payments against the gateway and settle the ones it has captured, failed or "
+        "refunded. Progress is checkpointed after every chunk; an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=_setting("CHUNK_SIZE"))
+        parser.add_argument("--workers", type=int, default=_setting("WORKERS"),
+                            help="Concurrent gateway requests, keep it within PAYMENT_GATEWAY['POOL_SIZE']")
+        parser.add_argument("--min-age", type=int, default=_setting("MIN_AGE"),
+                            help="Seconds a payment must have been pending, younger ones may still be in flight")
+        parser.add_argument("--checkpoint", default=str(_setting("CHECKPOINT_FILE")))
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options["checkpoint"])
+        state = None if options["restart"] or options["dry_run"] else self.load(checkpoint)
+        if state:
+            self.stdout.write(f"Resuming after payment #{state['last_id']} (run started {state['started_at']}).")
+        else:
+            state = {
+                "last_id": 0,
+                "cutoff": (timezone.now() - timedelta(seconds=options["min_age"])).isoformat(),
+                "started_at": timezone.now().isoformat(),
+                "counts": {},
+                "samples": {},
+            }
+
+        reconciler = Reconciler(options["workers"], dry_run=options["dry_run"])
+        reconciler.counts.update(state["counts"])
+        reconciler.samples.update(state["samples"])
+        started = time.monotonic()
+        scanned_before = reconciler.counts["scanned"]
+        try:
+            for chunk in pending_chunks(state["last_id"], datetime.fromisoformat(state["cutoff"]), options["chunk_size"]):
+                reconciler.run_chunk(chunk)
+                if reconciler.gateway_down:
+                    # the chunk isn't checkpointed, so the next run asks about it again
+                    self.summary(reconciler, started, scanned_before)
+                    raise CommandError("Payment gateway unavailable, stopping. Run again to resume.")
+                state.update(last_id=chunk[-1].id, counts=dict(reconciler.counts), samples=reconciler.samples)
+                if not options["dry_run"]:
+                    self.save(checkpoint, state)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"  up to payment #{chunk[-1].id}: {reconciler.counts['scanned']} scanned")
+        finally:
+            reconciler.close()
+
+        if checkpoint.exists() and not options["dry_run"]:
+            checkpoint.unlink()
+        self.summary(reconciler, started, scanned_before)
+
+    def load(self, checkpoint):
+        try:
+            return json.loads(checkpoint.read_text())
+        except FileNotFoundError:
+            return None
+
+    def save(self, checkpoint, state):
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        tmp = checkpoint.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, checkpoint)
+
+    def summary(self, reconciler, started, scanned_before):
+        elapsed = time.monotonic() - started
+        scanned = reconciler.counts["scanned"] - scanned_before
+        self.stdout.write(f"Scanned {scanned} pending payments in {elapsed:.1f}s ({scanned / max(elapsed, 1e-9):.0f}/s).")
+        for kind, count in sorted(reconciler.counts.items()):
+            if kind != "scanned" and count:
+                self.stdout.write(f"  {kind:<24} {count}")
+        for kind, examples in sorted(reconciler.samples.items()):
+            self.stdout.write(f"{kind}, e.g.:")
+            for example in examples:
+                self.stdout.write(f"  {example}")
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customer.gateway_standin import StandInGateway
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the Razorpay API (orders, payments, signatures) with configurable "
+        "latency and failure rate. Point RAZORPAY_BASE_URL at it to load-test checkout offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every API call")
+        parser.add_argument("--jitter", type=float, default=0, help="+/- milliseconds of random latency")
+        parser.add_argument("--error-rate", type=float, default=0, help="Fraction of API calls answered with a 503")
+        parser.add_argument("--key-secret", default=settings.RAZORPAY_KEY_SECRET or "standin-secret",
+                            help="Secret used to sign payments, must match RAZORPAY_KEY_SECRET")
+        parser.add_argument("--webhook-url", help="Deliver payment events here, e.g. "
+                                                  "http://127.0.0.1:8000/api/customer/razorpay/webhook/")
+        parser.add_argument("--webhook-secret", default=settings.RAZORPAY_WEBHOOK_SECRET,
+                            help="Secret used to sign webhooks, must match RAZORPAY_WEBHOOK_SECRET")
+
+    def handle(self, *args, **options):
+        gateway = StandInGateway(
+            key_secret=options["key_secret"],
+            latency=options["latency"] / 1000,
+            jitter=options["jitter"] / 1000,
+            error_rate=options["error_rate"],
+            host=options["host"],
+            port=options["port"],
+            webhook_url=options["webhook_url"],
+            webhook_secret=options["webhook_secret"],
+        )
+        self.stdout.write(f"Gateway stand-in listening on {gateway.url} (RAZORPAY_BASE_URL={gateway.url})")
+        try:
+            gateway.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            gateway.server.server_close()
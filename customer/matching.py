@@ -0,0 +1,208 @@
+import math
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+
+from .index_sync import SyncedIndex, matchable_providers
+from .ranking import ProviderArrays
+from .skills import skill_index
+
+
+DEFAULTS = {
+    "CELL_DEGREES": 0.05,        # grid cell edge, about 5.5 km north-south
+    "DEFAULT_RADIUS_KM": 10,     # for providers that haven't set service_km
+    "MAX_RADIUS_KM": 100,        # service_km is capped here, it bounds every search
+    "CANDIDATES": 20,            # nearest providers per service handed to customer/ranking.py
+    "DIRECT_SCAN": 1000,         # eligible sets up to this size are checked one by one instead of via the grid
+}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _setting(name):
+    return getattr(settings, "PROVIDER_MATCHING", {}).get(name, DEFAULTS[name])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Entry(NamedTuple):
+    latitude: float
+    longitude: float
+    radius_km: float
+    cell: tuple
+
+
+class ProviderIndex(SyncedIndex):
+    """
+    In-memory grid over matchable providers: each provider sits in the
+    CELL_DEGREES cell holding its location, so a lookup only touches the
+    cells around the customer. Kept in step with profile changes by
+    SyncedIndex (customer/index_sync.py).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._entries = {}
+        self._cells = defaultdict(set)
+        self.max_radius_km = 0.0
+
+    def _cell(self, latitude, longitude):
+        size = _setting("CELL_DEGREES")
+        return math.floor(latitude / size), math.floor(longitude / size)
+
+    def _load(self, queryset):
+        """provider id -> Entry for the providers in `queryset`, one query."""
+        entries = {}
+        for provider_id, latitude, longitude, service_km in queryset.values_list(
+            "id", "latitude", "longitude", "service_km",
+        ):
+            latitude, longitude = float(latitude), float(longitude)
+            radius_km = min(float(service_km or _setting("DEFAULT_RADIUS_KM")), _setting("MAX_RADIUS_KM"))
+            entries[provider_id] = Entry(latitude, longitude, radius_km, self._cell(latitude, longitude))
+        return entries
+
+    def _add(self, provider_id, entry):
+        self._entries[provider_id] = entry
+        self._cells[entry.cell].add(provider_id)
+
+    def _remove(self, provider_id):
+        entry = self._entries.pop(provider_id, None)
+        if entry is None:
+            return
+        cell = self._cells[entry.cell]
+        cell.discard(provider_id)
+        if not cell:
+            del self._cells[entry.cell]
+
+    def rebuild(self):
+        entries = self._load(matchable_providers())
+        self._entries = {}
+        self._cells = defaultdict(set)
+        for provider_id, entry in entries.items():
+            self._add(provider_id, entry)
+        self.max_radius_km = max((entry.radius_km for entry in entries.values()), default=0.0)
+
+    def replay(self, provider_ids):
+        entries = self._load(matchable_providers().filter(id__in=provider_ids))
+        for provider_id in provider_ids:
+            self._remove(provider_id)
+            if provider_id in entries:
+                self._add(provider_id, entries[provider_id])
+        # shrinking a radius leaves this high until the next rebuild, which only widens the search
+        self.max_radius_km = max([self.max_radius_km] + [entry.radius_km for entry in entries.values()])
+
+    def nearest(self, latitude, longitude, k=5, exclude=(), only=None):
+        """
+        Up to `k` (distance_km, provider_id) pairs, nearest first, for
+        providers whose own service radius reaches the given point,
+        optionally only those in the set `only`.
+        """
+        self.sync()
+        latitude, longitude = float(latitude), float(longitude)
+        entries = self._entries
+
+        found = []
+        if only is not None and len(only) <= _setting("DIRECT_SCAN"):
+            for provider_id in only:
+                entry = entries.get(provider_id)
+                if entry is None or provider_id in exclude:
+                    continue
+                distance = haversine_km(latitude, longitude, entry.latitude, entry.longitude)
+                if distance <= entry.radius_km:
+                    found.append((distance, provider_id))
+            found.sort()
+            return found[:k]
+
+        cells, max_radius_km = self._cells, self.max_radius_km
+        size = _setting("CELL_DEGREES")
+        # narrowest cell width anywhere in the search area, so ring bounds never overshoot
+        widest_latitude = min(abs(latitude) + max_radius_km / KM_PER_DEGREE + size, 89.0)
+        cell_km = size * KM_PER_DEGREE * math.cos(math.radians(widest_latitude))
+        row, col = self._cell(latitude, longitude)
+        ring = 0
+        while True:
+            # everything in this ring is at least (ring - 1) whole cells away
+            floor_km = (ring - 1) * cell_km
+            if floor_km > max_radius_km or (len(found) >= k and floor_km > found[k - 1][0]):
+                break
+            for cell in _ring(row, col, ring):
+                # a copy, another thread may be replaying changes into this cell
+                for provider_id in tuple(cells.get(cell, ())):
+                    entry = entries.get(provider_id)
+                    if entry is None or provider_id in exclude or (only is not None and provider_id not in only):
+                        continue
+                    distance = haversine_km(latitude, longitude, entry.latitude, entry.longitude)
+                    if distance <= entry.radius_km:
+                        found.append((distance, provider_id))
+            found.sort()
+            ring += 1
+        return found[:k]
+
+    def stats(self):
+        return {
+            "providers": len(self._entries),
+            "cells": len(self._cells),
+            "version": self._version,
+            "max_radius_km": self.max_radius_km,
+            "rebuilds": self.rebuilds,
+            "replayed": self.replayed,
+        }
+
+
+def _ring(row, col, ring):
+    if ring == 0:
+        yield row, col
+        return
+    for offset in range(-ring, ring + 1):
+        yield row - ring, col + offset
+        yield row + ring, col + offset
+    for offset in range(-ring + 1, ring):
+        yield row + offset, col - ring
+        yield row + offset, col + ring
+
+
+provider_index = ProviderIndex()
+
+
+def nearest_providers(latitude, longitude, k=5, exclude=(), only=None):
+    return provider_index.nearest(latitude, longitude, k, exclude, only)
+
+
+def match_providers(latitude, longitude, services, exclude=()):
+    """
+    service id -> provider id for each of `services` (SubCategory rows)
+    that some provider can do at the point. The skill index says who can
+    do each service, the geo index shortlists the nearest of them whose
+    radius covers the point, and customer/ranking.py picks among those by
+    distance, experience and current load. One query for the shortlist.
+    """
+    if latitude is None or longitude is None:
+        return {}
+    shortlists = {}
+    for service in services:
+        if service.id not in shortlists:
+            eligible = skill_index.providers_for_service(service.id, service.name)
+            shortlists[service.id] = [provider_id for _, provider_id in nearest_providers(
+                latitude, longitude, k=_setting("CANDIDATES"), exclude=exclude, only=eligible,
+            )]
+    shortlisted = {provider_id for shortlist in shortlists.values() for provider_id in shortlist}
+    if not shortlisted:
+        return {}
+
+    # re-checked here, a provider may have been blocked or moved since the index last synced
+    arrays = ProviderArrays.from_queryset(matchable_providers().filter(id__in=shortlisted))
+    matched = {}
+    for service_id, shortlist in shortlists.items():
+        ranked = arrays.rank(latitude, longitude, k=1, among=arrays.positions(shortlist)) if shortlist else []
+        if ranked:
+            provider_id = ranked[0][0]
+            matched[service_id] = provider_id
+            # the job just given counts against the provider for the next service
+            arrays.load[arrays.positions([provider_id])] += 1
+    return matched
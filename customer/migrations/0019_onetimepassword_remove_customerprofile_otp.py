@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0018_customerprofile_fcm_token_customerprofile_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customerprofile',
+            name='otp',
+        ),
+        migrations.RemoveField(
+            model_name='customerprofile',
+            name='otp_created_at',
+        ),
+        migrations.CreateModel(
+            name='OneTimePassword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('login', 'Login'), ('register', 'Register'), ('payment', 'Payment')], max_length=20)),
+                ('subject', models.CharField(max_length=64)),
+                ('code', models.CharField(max_length=6)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('purpose', 'subject'), name='unique_otp_per_subject')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0019_onetimepassword_remove_customerprofile_otp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['created_date'], name='systemlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['type', 'created_date'], name='systemlog_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0020_systemlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bankdetail',
+            index=models.Index(fields=['customer', 'created_date', 'id'], name='bankdetail_cust_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingbankdetailupdate',
+            index=models.Index(fields=['reviewed', 'created_at', 'id'], name='pendingbank_rev_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingprofileupdate',
+            index=models.Index(fields=['reviewed', 'created_at', 'id'], name='pendingprof_rev_created_idx'),
+        ),
+    ]
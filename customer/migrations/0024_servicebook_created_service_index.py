@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0008_subcategory_decimal_price'),
+        ('customer', '0023_decimal_cart_and_payment_amounts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicebook',
+            index=models.Index(fields=['created_date', 'service'], name='servicebook_created_svc_idx'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+import copy
+import threading
+
+from django.db.models.fields.files import FieldFile
+
+
+_stats_lock = threading.Lock()
+_write_stats = {}
+
+
+def write_stats():
+    """Per-model counters of what DirtyFieldsMixin wrote vs. skipped in this worker."""
+    with _stats_lock:
+        return {label: dict(counters) for label, counters in _write_stats.items()}
+
+
+def _record_write(label, written, skipped):
+    with _stats_lock:
+        counters = _write_stats.setdefault(label, {
+            "saves": 0,
+            "columns_written": 0,
+            "columns_skipped": 0,
+            "bytes_written": 0,
+            "bytes_skipped": 0,
+        })
+        counters["saves"] += 1
+        counters["columns_written"] += len(written)
+        counters["columns_skipped"] += len(skipped)
+        counters["bytes_written"] += sum(_size(value) for value in written)
+        counters["bytes_skipped"] += sum(_size(value) for value in skipped)
+
+
+def _size(value):
+    # rough on-disk size of a column value, good enough to compare full vs partial writes
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 8
+    return len(str(value).encode())
+
+
+def _tracked(value):
+    if isinstance(value, FieldFile):
+        return value.name
+    if isinstance(value, (dict, list)):
+        # JSON values are edited in place, the snapshot needs its own copy
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers the column values a row was loaded with and turns a bare save()
+    on an existing row into save(update_fields=<changed fields>), so flipping
+    one flag no longer rewrites every column. auto_now fields are always
+    included so updated_date keeps working. New rows and explicit
+    update_fields are saved as usual. Fields left out by only()/defer() count
+    as changed once assigned.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot(field_names)
+        return instance
+
+    def _snapshot(self, attnames=None):
+        if attnames is None:
+            attnames = [f.attname for f in self._meta.concrete_fields if f.attname not in self.get_deferred_fields()]
+        loaded = getattr(self, "_loaded_values", {})
+        for attname in attnames:
+            loaded[attname] = _tracked(self.__dict__.get(attname))
+        self._loaded_values = loaded
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # reloaded values are clean again, including a deferred field loaded on first access
+        if fields is not None:
+            fields = [f.attname for f in self._meta.concrete_fields if f.name in fields or f.attname in fields]
+        self._snapshot(fields)
+
+    def get_dirty_fields(self):
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return None
+
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if field.attname not in loaded:
+                # a deferred field that was never loaded, so anything in it was assigned
+                if field.attname in self.__dict__:
+                    dirty.append(field.name)
+                continue
+            value = self.__dict__.get(field.attname)
+            if isinstance(value, FieldFile) and not value._committed:
+                dirty.append(field.name)
+            elif _tracked(value) != loaded[field.attname]:
+                dirty.append(field.name)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        concrete_fields = self._meta.concrete_fields
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                auto_now = [f.name for f in concrete_fields if getattr(f, "auto_now", False) and f.name not in dirty]
+                kwargs["update_fields"] = dirty + auto_now
+
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            written_fields = [f for f in concrete_fields if not f.primary_key]
+        else:
+            written_fields = [f for f in concrete_fields if f.name in update_fields or f.attname in update_fields]
+        skipped_fields = [f for f in concrete_fields if not f.primary_key and f not in written_fields]
+        _record_write(
+            self._meta.label,
+            [getattr(self, f.attname) for f in written_fields],
+            [self.__dict__.get(f.attname) for f in skipped_fields],
+        )
+        self._snapshot([f.attname for f in written_fields] if update_fields is not None else None)
@@ -1,8 +1,10 @@
+from decimal import Decimal
+
 from django.db import models
 from django.utils import timezone
-import random
+from .mixins import DirtyFieldsMixin
 
-class CustomerProfile(models.Model):
+class CustomerProfile(DirtyFieldsMixin, models.Model):
     ROLE_METHOD_CHOICES = [
         ('user', 'User'),
         ('service_provider', 'Service Provider'),
@@ -15,6 +17,8 @@ class CustomerProfile(models.Model):
     mobile = models.CharField(max_length=12, unique=True, blank=False, null=False)
     role = models.CharField(max_length=20,choices=ROLE_METHOD_CHOICES, blank=False, null=False) # user, electrician,, admin
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # resized copies of profile_image, written by the background worker in customer/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     experience_year = models.IntegerField(blank=True, null=True)
     service_skill = models.TextField(blank=True, null=True)
     service_km = models.IntegerField(blank=True, null=True)
@@ -27,8 +31,6 @@ class CustomerProfile(models.Model):
     wallet_balance = models.FloatField(default=0.0)
     is_blocked = models.BooleanField(default=False)
     blocked_reason = models.TextField(blank=True, null=True)
-    otp = models.CharField(max_length=6, blank=True, null=True)
-    otp_created_at = models.DateTimeField(blank=True, null=True)
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
     categories = models.ManyToManyField('admin_panel.SubCategory', blank=True, related_name='service_categories')
@@ -45,20 +47,47 @@ class CustomerProfile(models.Model):
     def __str__(self):
         return self.username
     
-    def create_otp(self):
-        self.otp = str(random.randint(100000, 999999))
-        self.otp_created_at = timezone.now()
-        self.save()
-        return self.otp
+    # OTPs live in the OTP store (customer/otp.py), not on the profile row
+    def create_otp(self, purpose='login'):
+        from .otp import get_otp_store
+        return get_otp_store().issue(purpose, self.pk)
+
+    def current_otp(self, purpose='login'):
+        from .otp import get_otp_store
+        return get_otp_store().get(purpose, self.pk)
 
-    def is_otp_valid(self):
-        if self.otp_created_at:
-            time_difference = timezone.now() - self.otp_created_at
-            return time_difference.total_seconds() <= 600  # 10 min
-        return False
+    def is_otp_valid(self, purpose='login'):
+        return self.current_otp(purpose) is not None
 
-    def otp_verify(self, post_otp):
-        return self.otp == post_otp
+    def otp_verify(self, post_otp, purpose='login'):
+        from .otp import get_otp_store
+        return get_otp_store().verify(purpose, self.pk, post_otp)
+
+    def clear_otp(self, purpose='login'):
+        from .otp import get_otp_store
+        get_otp_store().consume(purpose, self.pk)
+
+
+class OneTimePassword(models.Model):
+    PURPOSE_CHOICES = [
+        ('login', 'Login'),
+        ('register', 'Register'),
+        ('payment', 'Payment'),
+    ]
+
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    subject = models.CharField(max_length=64)  # profile id, or booking id for payment OTPs
+    code = models.CharField(max_length=6)
+    expires_at = models.DateTimeField(db_index=True)
+    created_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['purpose', 'subject'], name='unique_otp_per_subject'),
+        ]
+
+    def __str__(self):
+        return f"{self.purpose} OTP for {self.subject}"
 
 
 class Address(models.Model):
@@ -91,6 +120,11 @@ class BankDetail(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'created_date', 'id'], name='bankdetail_cust_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.account_holder_name} - {self.bank_name} ({self.account_number[-4:]})"
 
@@ -102,6 +136,11 @@ class PendingBankDetailUpdate(models.Model):
     approved = models.BooleanField(default=False)
     reviewed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewed', 'created_at', 'id'], name='pendingbank_rev_created_idx'),
+        ]
+
     def __str__(self):
         return f"Pending update for {self.bank_detail.customer} - {self.bank_detail.account_number[-4:]}"
     
@@ -113,6 +152,11 @@ class PendingProfileUpdate(models.Model):
     approved = models.BooleanField(default=False)
     reviewed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewed', 'created_at', 'id'], name='pendingprof_rev_created_idx'),
+        ]
+
     def __str__(self):
         return f"Pending update for {self.profile.username}"
 
@@ -121,9 +165,18 @@ class SystemLog(models.Model):
     type = models.CharField(max_length=50)  # login, wallet_update, manual_assign, etc.
     performed_by = models.ForeignKey(CustomerProfile, on_delete=models.SET_NULL, null=True)
     remark = models.TextField(blank=True, null=True)
-    created_date = models.DateTimeField(auto_now_add=True)
+    # when the event happened; a default rather than auto_now_add so rows written
+    # later in a batch by customer/audit.py keep the time they were logged
+    created_date = models.DateTimeField(default=timezone.now, editable=False)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # month range scans for archiving and "recent logs" queries
+            models.Index(fields=['created_date'], name='systemlog_created_idx'),
+            models.Index(fields=['type', 'created_date'], name='systemlog_type_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type} by {self.performed_by}"
     
@@ -147,8 +200,8 @@ class ServiceCart(models.Model):
     service = models.ForeignKey("admin_panel.SubCategory", on_delete=models.CASCADE)
     num_of_tech = models.IntegerField(default=1)
     qty = models.IntegerField(default=1)
-    price = models.FloatField(default=0.0)
-    total_price = models.FloatField(default=0.0)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     status = models.CharField(max_length=20, choices=STATUS_CHOICES ,default='pending')
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
@@ -158,7 +211,7 @@ class ServiceCart(models.Model):
         return f"{self.service.name} x {self.qty}"
 
 
-class ServiceBook(models.Model):
+class ServiceBook(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('assign', 'Assigned'),
@@ -208,6 +261,12 @@ class ServiceBook(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # booking-count windows for section rankings (admin_panel/rankings.py)
+            models.Index(fields=['created_date', 'service'], name='servicebook_created_svc_idx'),
+        ]
+
     def __str__(self):
         return f"Booking #{self.id} by {self.user.username}"
 
@@ -259,12 +318,103 @@ class Payment(models.Model):
     user = models.ForeignKey("CustomerProfile", on_delete=models.CASCADE, related_name="payments")
     order_id = models.CharField(max_length=255, null=True, blank=True)
     payment_id = models.CharField(max_length=255, null=True, blank=True)
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default="pending")
     method = models.CharField(max_length=50, blank=True, null=True)
     transaction_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     receipt_url = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # verify, webhooks and reconciliation look payments up by gateway order
+            models.Index(fields=["order_id"], name="payment_order_id_idx"),
+            # keyset scan over pending payments in reconcile_payments
+            models.Index(fields=["id"], name="payment_pending_idx", condition=models.Q(status="pending")),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.payment_id} - {self.status}"
+
+class PaymentOrderOutbox(models.Model):
+    """
+    A gateway order still to be created for a Payment. Written in the same
+    transaction as the bookings at checkout and sent after commit, so the
+    gateway round trip never holds a database transaction (see customer/payments.py).
+    """
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name="outbox")
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="paymentoutbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Order for payment #{self.payment_id} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """The first response to a request sent with an Idempotency-Key header (see customer/idempotency.py)."""
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    STATUS_CHOICES = [
+        (IN_PROGRESS, "In progress"),
+        (DONE, "Done"),
+    ]
+
+    user = models.ForeignKey(CustomerProfile, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class PaymentWebhookEvent(models.Model):
+    """
+    A gateway webhook delivery, stored exactly as received. The request only
+    checks the signature and inserts the row; process_payment_webhooks applies
+    the events to Payment rows in batches (see customer/webhooks.py).
+    """
+    event_id = models.CharField(max_length=64, unique=True)  # X-Razorpay-Event-Id, repeats are ignored
+    body = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"], name="webhookevent_unprocessed_idx", condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
     def __str__(self):
-        return f"Payment {self.payment_id} - {self.status}"
\ No newline at end of file
+        return f"Webhook {self.event_id}"
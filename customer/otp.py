@@ -0,0 +1,118 @@
+import hmac
+import secrets
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OneTimePassword
+
+
+DEFAULT_TTL = 600  # 10 min
+
+
+def generate_code():
+    return str(secrets.randbelow(900000) + 100000)
+
+
+class BaseOTPStore:
+    """
+    OTPs keyed by (purpose, subject), e.g. ("login", <profile id>) or
+    ("payment", <booking id>). Every operation is a single keyed lookup and
+    never touches the CustomerProfile table.
+    """
+
+    def ttl(self, purpose):
+        ttls = getattr(settings, "OTP_STORE", {}).get("TTL", {})
+        return ttls.get(purpose, DEFAULT_TTL)
+
+    def issue(self, purpose, subject):
+        """Create (or replace) the OTP for this subject and return it."""
+        raise NotImplementedError
+
+    def get(self, purpose, subject):
+        """Return the unexpired OTP for this subject, or None."""
+        raise NotImplementedError
+
+    def consume(self, purpose, subject):
+        raise NotImplementedError
+
+    def verify(self, purpose, subject, code):
+        current = self.get(purpose, subject)
+        return current is not None and code is not None and hmac.compare_digest(current, str(code))
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """One row per (purpose, subject) in customer_onetimepassword, written with a single upsert."""
+
+    def issue(self, purpose, subject):
+        now = timezone.now()
+        otp = OneTimePassword(
+            purpose=purpose,
+            subject=str(subject),
+            code=generate_code(),
+            created_date=now,
+            expires_at=now + timedelta(seconds=self.ttl(purpose)),
+        )
+        OneTimePassword.objects.bulk_create(
+            [otp],
+            update_conflicts=True,
+            unique_fields=["purpose", "subject"],
+            update_fields=["code", "created_date", "expires_at"],
+        )
+        return otp.code
+
+    def get(self, purpose, subject):
+        return (
+            OneTimePassword.objects
+            .filter(purpose=purpose, subject=str(subject), expires_at__gt=timezone.now())
+            .values_list("code", flat=True)
+            .first()
+        )
+
+    def consume(self, purpose, subject):
+        OneTimePassword.objects.filter(purpose=purpose, subject=str(subject)).delete()
+
+    def purge_expired(self, chunk_size=5000):
+        """
+        Delete expired rows, `chunk_size` at a time so no single DELETE locks
+        much of the table, and return how many went. Run by
+        `manage.py purge_expired_otps`; payment OTPs of abandoned bookings
+        are never consumed and would otherwise stay forever.
+        """
+        now = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                OneTimePassword.objects.filter(expires_at__lte=now).values_list("id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                return total
+            total += OneTimePassword.objects.filter(id__in=ids).delete()[0]
+
+
+class CacheOTPStore(BaseOTPStore):
+    """OTPs live in the default Django cache and expire through the cache timeout."""
+
+    def _key(self, purpose, subject):
+        return f"otp:{purpose}:{subject}"
+
+    def issue(self, purpose, subject):
+        code = generate_code()
+        cache.set(self._key(purpose, subject), code, self.ttl(purpose))
+        return code
+
+    def get(self, purpose, subject):
+        return cache.get(self._key(purpose, subject))
+
+    def consume(self, purpose, subject):
+        cache.delete(self._key(purpose, subject))
+
+
+@lru_cache(maxsize=None)
+def get_otp_store():
+    backend = getattr(settings, "OTP_STORE", {}).get("BACKEND", "customer.otp.DatabaseOTPStore")
+    return import_string(backend)()
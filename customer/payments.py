@@ -0,0 +1,148 @@
+import logging
+from datetime import timedelta
+
+import razorpay
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .gateway import get_client
+from .models import Payment, PaymentOrderOutbox
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "MAX_ATTEMPTS": 8,        # attempts before the order (and its payment) is marked failed
+    "RETRY_DELAY": 15,        # seconds before the first retry, doubled after every failure
+    "MAX_RETRY_DELAY": 900,
+    "LEASE": 60,              # seconds a claimed row stays hidden from other dispatchers
+}
+
+# worth another attempt; anything else (e.g. BadRequestError) fails the order right away
+TRANSIENT_ERRORS = (
+    requests.RequestException,  # includes GatewayUnavailable while the circuit is open
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+    ValueError,  # unparseable gateway response
+)
+
+
+def _setting(name):
+    return getattr(settings, "PAYMENT_OUTBOX", {}).get(name, DEFAULTS[name])
+
+
+def order_payload(payment):
+    return {
+        "amount": int((payment.amount * 100).to_integral_value()),  # paise
+        "currency": "INR",
+        "receipt": f"payment-{payment.id}",
+        "payment_capture": "1",
+    }
+
+
+def enqueue_order(payment):
+    """Record that `payment` needs a gateway order. Call inside the checkout transaction."""
+    return PaymentOrderOutbox.objects.create(payment=payment, payload=order_payload(payment))
+
+
+def _claim(outbox_id, now):
+    # a single UPDATE, so two dispatchers can't both send the same row
+    return PaymentOrderOutbox.objects.filter(
+        id=outbox_id, status=PaymentOrderOutbox.PENDING, next_attempt_at__lte=now,
+    ).update(attempts=F("attempts") + 1, next_attempt_at=now + timedelta(seconds=_setting("LEASE")), updated_at=now)
+
+
+class OrderConflict(Exception):
+    """The gateway has orders for this receipt, but none for the amount being charged."""
+
+
+def _existing_order(client, payload):
+    """
+    An order an earlier, interrupted attempt already created for this
+    receipt, a paid one first: the customer may have paid it before the
+    attempt came back, and a second order would let them pay twice.
+    """
+    orders = client.order.all({"receipt": payload["receipt"]}).get("items", [])
+    matching = [order for order in orders if order.get("amount") == payload["amount"]]
+    if orders and not matching:
+        raise OrderConflict(f"Receipt {payload['receipt']} already has gateway orders for another amount")
+    matching.sort(key=lambda order: order.get("status") != "paid")
+    return matching[0] if matching else None
+
+
+def _failed(outbox, error, permanent, now):
+    outbox.last_error = f"{type(error).__name__}: {error}"[:2000]
+    if permanent or outbox.attempts >= _setting("MAX_ATTEMPTS"):
+        outbox.status = PaymentOrderOutbox.FAILED
+        with transaction.atomic():
+            PaymentOrderOutbox.objects.filter(id=outbox.id).update(
+                status=outbox.status, last_error=outbox.last_error, updated_at=now,
+            )
+            Payment.objects.filter(id=outbox.payment_id, status="pending").update(status="failed", updated_at=now)
+        logger.error("Gateway order for payment #%s failed: %s", outbox.payment_id, outbox.last_error)
+        return
+
+    delay = min(_setting("RETRY_DELAY") * 2 ** (outbox.attempts - 1), _setting("MAX_RETRY_DELAY"))
+    outbox.next_attempt_at = now + timedelta(seconds=delay)
+    PaymentOrderOutbox.objects.filter(id=outbox.id).update(
+        next_attempt_at=outbox.next_attempt_at, last_error=outbox.last_error, updated_at=now,
+    )
+    logger.warning(
+        "Gateway order for payment #%s failed (attempt %s), retrying in %ss: %s",
+        outbox.payment_id, outbox.attempts, delay, outbox.last_error,
+    )
+
+
+def dispatch_order(outbox_id):
+    """
+    Create the gateway order for one outbox row and store its id on the
+    Payment. Must run outside any transaction that wrote the row, since the
+    gateway call can take seconds. Returns the row, or None if it isn't due
+    or another dispatcher claimed it first.
+    """
+    now = timezone.now()
+    if not _claim(outbox_id, now):
+        return None
+    outbox = PaymentOrderOutbox.objects.select_related("payment").get(id=outbox_id)
+
+    client = get_client()
+    try:
+        order = _existing_order(client, outbox.payload) if outbox.attempts > 1 else None
+        if order is None:
+            order = client.order.create(outbox.payload)
+        order_id = order["id"]
+    except TRANSIENT_ERRORS as exc:
+        _failed(outbox, exc, permanent=False, now=timezone.now())
+        return outbox
+    except (razorpay.errors.BadRequestError, OrderConflict) as exc:
+        _failed(outbox, exc, permanent=True, now=timezone.now())
+        return outbox
+
+    now = timezone.now()
+    with transaction.atomic():
+        Payment.objects.filter(id=outbox.payment_id).update(order_id=order_id, updated_at=now)
+        PaymentOrderOutbox.objects.filter(id=outbox.id).update(
+            status=PaymentOrderOutbox.SENT, last_error="", updated_at=now,
+        )
+    outbox.status = PaymentOrderOutbox.SENT
+    outbox.last_error = ""
+    outbox.payment.order_id = order_id
+    return outbox
+
+
+def dispatch_due(limit=100):
+    """Send up to `limit` outbox rows whose next attempt is due. Returns {status: count}."""
+    due = (
+        PaymentOrderOutbox.objects
+        .filter(status=PaymentOrderOutbox.PENDING, next_attempt_at__lte=timezone.now())
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:limit]
+    )
+    counts = {PaymentOrderOutbox.SENT: 0, PaymentOrderOutbox.PENDING: 0, PaymentOrderOutbox.FAILED: 0, "skipped": 0}
+    for outbox_id in list(due):
+        outbox = dispatch_order(outbox_id)
+        counts["skipped" if outbox is None else outbox.status] += 1
+    return counts
@@ -0,0 +1,144 @@
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import CustomerProfile
+
+
+DEFAULTS = {
+    "DISTANCE_WEIGHT": 0.6,
+    "DISTANCE_SCALE_KM": 5,     # closeness is 1 on the spot, 1/2 at this distance, 1/3 at twice it
+    "EXPERIENCE_WEIGHT": 0.25,
+    "LOAD_WEIGHT": 0.15,
+    "EXPERIENCE_CAP": 10,       # years; more than this scores the same
+    "LOAD_CAP": 5,              # active jobs at which the load penalty is full
+    "DEFAULT_RADIUS_KM": 10,    # for providers that haven't set service_km
+}
+
+# bookings that keep a provider busy
+ACTIVE_STATUSES = ("assign", "arriving")
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _setting(name):
+    return getattr(settings, "PROVIDER_RANKING", {}).get(name, DEFAULTS[name])
+
+
+def _unit_vectors(latitudes, longitudes):
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    cos_latitudes = np.cos(latitudes)
+    return cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)
+
+
+class ProviderArrays:
+    """
+    Provider columns packed into contiguous NumPy arrays sorted by id, so
+    distances and scores for every provider come out of one vectorized
+    pass instead of a Python loop.
+
+    Locations are stored as unit vectors. The squared chord between two of
+    them is 4 * sin^2(angle / 2), four times the haversine term, so the
+    radius check is a few multiply-adds per provider against a bound
+    precomputed from each provider's radius, and the trigonometry that
+    turns a chord into km only runs for providers in range.
+    """
+
+    def __init__(self, ids, latitudes, longitudes, radius_km, experience, load):
+        order = np.argsort(ids, kind="stable")
+        self.ids = np.ascontiguousarray(np.asarray(ids, dtype=np.int64)[order])
+        self.x, self.y, self.z = _unit_vectors(
+            np.asarray(latitudes, dtype=np.float64)[order], np.asarray(longitudes, dtype=np.float64)[order],
+        )
+        self.radius_km = np.asarray(radius_km, dtype=np.float64)[order]
+        angle = np.minimum(self.radius_km / EARTH_RADIUS_KM, np.pi)
+        self.max_chord2 = (2 * np.sin(angle / 2)) ** 2
+        self.experience = np.asarray(experience, dtype=np.float64)[order]
+        self.load = np.asarray(load, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        rows of (id, latitude, longitude, service_km, experience_year, load);
+        None means unset. Rows without a location can't be ranked and are skipped.
+        """
+        default_radius = _setting("DEFAULT_RADIUS_KM")
+        rows = [row for row in rows if row[1] is not None and row[2] is not None]
+        columns = list(zip(*rows)) or [()] * 6
+        ids, latitudes, longitudes, radius_km, experience, load = columns
+        return cls(
+            ids,
+            [float(value) for value in latitudes],
+            [float(value) for value in longitudes],
+            [float(value or default_radius) for value in radius_km],
+            [float(value or 0) for value in experience],
+            [float(value or 0) for value in load],
+        )
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        """Packed arrays for the providers in `queryset`, load included, in one query."""
+        rows = queryset.annotate(
+            active_jobs=Count("assigned_jobs", filter=Q(assigned_jobs__status__in=ACTIVE_STATUSES)),
+        ).values_list("id", "latitude", "longitude", "service_km", "experience_year", "active_jobs")
+        return cls.from_rows(rows)
+
+    def positions(self, provider_ids):
+        """Array positions of those of `provider_ids` that are present; the others are dropped."""
+        wanted = np.asarray(provider_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, wanted)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == wanted[found]
+        return positions[found]
+
+    def _chord2(self, latitude, longitude, positions):
+        qx, qy, qz = _unit_vectors(float(latitude), float(longitude))
+        x, y, z = (self.x, self.y, self.z) if positions is None else (
+            self.x[positions], self.y[positions], self.z[positions],
+        )
+        chord2 = (x - qx) ** 2
+        chord2 += (y - qy) ** 2
+        chord2 += (z - qz) ** 2
+        return chord2
+
+    def distances(self, latitude, longitude):
+        """Distance in km from the point to every provider."""
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.sqrt(self._chord2(latitude, longitude, None)) / 2, 1.0))
+
+    def reachable(self, latitude, longitude, among=None):
+        """
+        (positions, distance_km, score) for providers whose own radius
+        reaches the point, optionally only among the given positions. The
+        score blends closeness, capped experience and a penalty for active
+        jobs.
+        """
+        chord2 = self._chord2(latitude, longitude, among)
+        reach = self.max_chord2 if among is None else self.max_chord2[among]
+        inside = np.flatnonzero(chord2 <= reach)
+        positions = inside if among is None else np.asarray(among)[inside]
+
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.sqrt(chord2[inside]) / 2, 1.0))
+        scale, experience_cap, load_cap = _setting("DISTANCE_SCALE_KM"), _setting("EXPERIENCE_CAP"), _setting("LOAD_CAP")
+        score = (
+            _setting("DISTANCE_WEIGHT") * scale / (scale + distance)
+            + _setting("EXPERIENCE_WEIGHT") * np.minimum(self.experience[positions], experience_cap) / experience_cap
+            - _setting("LOAD_WEIGHT") * np.minimum(self.load[positions], load_cap) / load_cap
+        )
+        return positions, distance, score
+
+    def rank(self, latitude, longitude, k=5, among=None):
+        """
+        Up to `k` (provider_id, score, distance_km) tuples, best first, for
+        providers whose radius reaches the point. `among` limits the ranking
+        to those positions (see positions()).
+        """
+        positions, distance, score = self.reachable(latitude, longitude, among)
+        order = np.arange(len(positions))
+        if len(order) > k:
+            # only the top k are sorted, the rest is partitioned away in linear time
+            order = np.argpartition(-score, k - 1)[:k]
+        order = order[np.lexsort((distance[order], -score[order]))]
+        return [(int(self.ids[positions[i]]), float(score[i]), float(distance[i])) for i in order]
@@ -0,0 +1,136 @@
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import razorpay
+from django.db import transaction
+from django.utils import timezone
+
+from .gateway import GatewayUnavailable, get_client
+from .models import Payment
+from .payments import TRANSIENT_ERRORS
+from .webhooks import MISMATCH, PAYMENT_STATUSES, UPDATED_FIELDS, in_paise
+
+
+logger = logging.getLogger(__name__)
+
+# the first gateway status found among an order's payments decides; "failed"
+# only counts when every attempt failed, otherwise the customer may still pay
+PRIORITY = ["refunded", "captured", "failed"]
+
+
+def pending_chunks(after_id, cutoff, chunk_size):
+    """
+    Pending payments that have a gateway order and were created before
+    `cutoff`, in id order, one keyset page (id > last id seen) at a time.
+    """
+    while True:
+        chunk = list(
+            Payment.objects.filter(
+                status="pending", order_id__isnull=False, transaction_date__lt=cutoff, id__gt=after_id,
+            )
+            .order_by("id")
+            .only("id", "order_id", "amount", "status")[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+
+
+def gateway_outcome(items):
+    """(Payment.status, gateway payment) the order's gateway payments imply, or (None, None) to leave it pending."""
+    statuses = {item.get("status") for item in items}
+    for gateway_status in PRIORITY:
+        if gateway_status == "failed" and statuses != {"failed"}:
+            continue
+        matches = [item for item in items if item.get("status") == gateway_status]
+        if matches:
+            return PAYMENT_STATUSES[gateway_status], matches[-1]
+    return None, None
+
+
+class Reconciler:
+    """
+    Checks chunks of pending payments against the gateway, `workers` orders
+    at a time over the shared keep-alive client, and moves the ones the
+    gateway has settled with one bulk_update per chunk. A capture for the
+    wrong amount is not settled but counted and logged for review. Tallies
+    go to `counts`; up to `sample_size` examples of each kind go to `samples`.
+    """
+
+    def __init__(self, workers, dry_run=False, sample_size=10):
+        self.client = get_client()
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="reconcile")
+        self.dry_run = dry_run
+        self.sample_size = sample_size
+        self.counts = Counter()
+        self.samples = {}
+        self.gateway_down = False
+
+    def close(self):
+        self.pool.shutdown()
+
+    def _fetch(self, order_id):
+        try:
+            return self.client.order.payments(order_id).get("items", []), None
+        except TRANSIENT_ERRORS + (razorpay.errors.BadRequestError,) as exc:
+            return None, exc
+
+    def _sample(self, kind, payment, detail):
+        examples = self.samples.setdefault(kind, [])
+        if len(examples) < self.sample_size:
+            examples.append(f"payment #{payment.id} order {payment.order_id}: {detail}")
+
+    def run_chunk(self, payments):
+        results = self.pool.map(self._fetch, [payment.order_id for payment in payments])
+        changes = {}
+        for payment, (items, error) in zip(payments, results):
+            self.counts["scanned"] += 1
+            if error is not None:
+                self.counts["gateway errors"] += 1
+                self._sample("gateway errors", payment, f"{type(error).__name__}: {error}")
+                self.gateway_down = self.gateway_down or isinstance(error, GatewayUnavailable)
+                continue
+
+            status, item = gateway_outcome(items)
+            if status is None:
+                self.counts["still pending" if items else "no payment at gateway"] += 1
+                continue
+
+            expected = in_paise(payment.amount)
+            if status == "success" and item.get("amount") != expected:
+                # never settled automatically, it stays pending and is reported on every run until someone looks
+                self.counts[MISMATCH] += 1
+                self._sample(MISMATCH, payment, f"expected {expected} paise, {item.get('id')} captured {item.get('amount')}")
+                logger.warning(
+                    "Payment #%s left pending for review: order %s expected %s paise, gateway captured %s",
+                    payment.id, payment.order_id, expected, item.get("amount"),
+                )
+                continue
+
+            kind = f"pending -> {status}"
+            self.counts[kind] += 1
+            self._sample(kind, payment, f"{item.get('id')} is {item.get('status')}")
+            changes[payment.id] = {
+                "status": status,
+                "payment_id": item.get("id"),
+                "method": item.get("method") or "",
+                "receipt_url": item.get("invoice_id") or "",
+            }
+
+        if changes and not self.dry_run:
+            self.apply(changes)
+
+    def apply(self, changes):
+        now = timezone.now()
+        with transaction.atomic():
+            # verify or a webhook may have settled some of these while we were asking
+            payments = list(Payment.objects.select_for_update().filter(id__in=list(changes), status="pending"))
+            for payment in payments:
+                for name, value in changes[payment.id].items():
+                    setattr(payment, name, value)
+                payment.updated_at = now
+            Payment.objects.bulk_update(payments, UPDATED_FIELDS, batch_size=1000)
+        self.counts["updated"] += len(payments)
+        self.counts["settled meanwhile"] += len(changes) - len(payments)
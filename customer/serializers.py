@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import CustomerProfile, ServiceCart
+from .images import ImageVariantsField
 
 class RegisterSerializer(serializers.ModelSerializer):
     fcm_token = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -65,9 +66,26 @@ class ServiceCartSerializer(serializers.ModelSerializer):
             'id', 'service', 'service_name', 'qty', 'num_of_tech',
             'price', 'total_price', 'status'
         ]
+        # numbers in JSON, as they were when these were FloatFields
+        extra_kwargs = {
+            'price': {'coerce_to_string': False},
+            'total_price': {'coerce_to_string': False},
+        }
+
+
+class CartOperationSerializer(serializers.Serializer):
+    service = serializers.IntegerField()
+    qty = serializers.IntegerField(min_value=0, default=1)  # 0 removes the service from the cart
+    num_of_tech = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
 
 
 class CustomerProfileSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = CustomerProfile
         fields = [
@@ -79,6 +97,7 @@ class CustomerProfileSerializer(serializers.ModelSerializer):
             "role",
             "date_of_birth",
             "profile_image",
+            "image_variants",
             "latitude",
             "longitude"
         ]
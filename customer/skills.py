@@ -0,0 +1,134 @@
+import re
+from collections import defaultdict
+
+from .index_sync import SyncedIndex, matchable_providers
+from .models import CustomerProfile
+
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to", "with",
+    "all", "any", "etc", "service", "services", "work", "works",
+}
+
+# (suffix, replacement), longest first; only the first match is stripped
+SUFFIXES = [
+    ("ations", ""), ("ation", ""), ("ments", ""), ("ment", ""), ("ians", ""), ("ian", ""),
+    ("ings", ""), ("ing", ""), ("ies", "y"), ("ers", ""), ("er", ""), ("ed", ""), ("es", ""),
+    ("al", ""), ("s", ""),
+]
+
+_EMPTY = frozenset()
+
+
+def stem(word):
+    """
+    Light suffix stripping, enough to fold the forms a skill is written in
+    ("plumber", "plumbing", "wires", "wiring", "installation") onto one
+    term. Applied the same way to skills and service names, so the odd
+    stem only has to be consistent, not a real word.
+    """
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            word = word[: -len(suffix)] + replacement
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "aeiou":
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Stemmed terms of free text, stopwords dropped."""
+    return {stem(word) for word in WORD_RE.findall((text or "").lower()) if word not in STOPWORDS}
+
+
+class SkillIndex(SyncedIndex):
+    """
+    Inverted index from skill terms and categories to the matchable
+    providers that have them, so "who can do this service" is a few set
+    operations rather than re-reading and splitting every provider's
+    service_skill. Terms come from service_skill through terms(); category
+    postings mirror the categories M2M. Kept in step with profile and M2M
+    changes by SyncedIndex (customer/index_sync.py).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._by_term = defaultdict(set)
+        self._by_category = defaultdict(set)
+        self._providers = {}  # provider id -> (terms, category ids), to undo its postings
+
+    def _load(self, queryset):
+        """provider id -> (terms, category ids) for the providers in `queryset`, two queries."""
+        loaded = {provider_id: (frozenset(terms(skill)), set()) for provider_id, skill in
+                  queryset.values_list("id", "service_skill")}
+        through = CustomerProfile.categories.through
+        for provider_id, category_id in through.objects.filter(
+            customerprofile__in=queryset.values("id"),
+        ).values_list("customerprofile_id", "subcategory_id"):
+            loaded[provider_id][1].add(category_id)
+        return loaded
+
+    def _add(self, provider_id, postings):
+        provider_terms, categories = postings
+        self._providers[provider_id] = postings
+        for term in provider_terms:
+            self._by_term[term].add(provider_id)
+        for category_id in categories:
+            self._by_category[category_id].add(provider_id)
+
+    def _remove(self, provider_id):
+        postings = self._providers.pop(provider_id, None)
+        if postings is None:
+            return
+        for index, keys in ((self._by_term, postings[0]), (self._by_category, postings[1])):
+            for key in keys:
+                providers = index[key]
+                providers.discard(provider_id)
+                if not providers:
+                    del index[key]
+
+    def rebuild(self):
+        loaded = self._load(matchable_providers())
+        self._by_term = defaultdict(set)
+        self._by_category = defaultdict(set)
+        self._providers = {}
+        for provider_id, postings in loaded.items():
+            self._add(provider_id, postings)
+
+    def replay(self, provider_ids):
+        loaded = self._load(matchable_providers().filter(id__in=provider_ids))
+        for provider_id in provider_ids:
+            self._remove(provider_id)
+            if provider_id in loaded:
+                self._add(provider_id, loaded[provider_id])
+
+    def providers_with_terms(self, text):
+        """Providers whose skills cover every term of `text`; empty if it has none."""
+        self.sync()
+        wanted = terms(text)
+        if not wanted:
+            return set()
+        postings = sorted((self._by_term.get(term, _EMPTY) for term in wanted), key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def providers_for_service(self, service_id, name):
+        """Providers who list the service among their categories or whose skills cover its name."""
+        self.sync()
+        return set(self._by_category.get(service_id, _EMPTY)) | self.providers_with_terms(name)
+
+    def stats(self):
+        return {
+            "providers": len(self._providers),
+            "terms": len(self._by_term),
+            "categories": len(self._by_category),
+            "version": self._version,
+            "rebuilds": self.rebuilds,
+            "replayed": self.replayed,
+        }
+
+
+skill_index = SkillIndex()
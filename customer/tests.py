@@ -1,3 +1,782 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import random
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import requests
+import user_agents
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from admin_panel.models import Category, SubCategory
+
+from .audit import SystemLogBuffer
+from .devices import DEFAULT_WARMUP_USER_AGENTS, MAX_USER_AGENT_LENGTH, DeviceInfo, _detect, detect_device, device_cache_stats
+from .gateway import CircuitBreaker, GatewaySession, GatewayUnavailable, breaker
+from .gateway_standin import StandInGateway, payment_signature
+from .idempotency import idempotent
+from .index_sync import CHANGE_KEY, SyncedIndex, current_version, providers_changed
+from .management.commands.bench_ranking import naive_rank
+from .matching import ProviderIndex, match_providers, provider_index
+from .otp import get_otp_store
+from .models import (
+    Cart, CustomerProfile, IdempotencyKey, OneTimePassword, Payment, PaymentOrderOutbox, PaymentWebhookEvent, ServiceBook,
+    ServiceCart, SystemLog,
+)
+from .payments import dispatch_order, enqueue_order
+from .ranking import ProviderArrays
+from .skills import skill_index
+from .webhooks import process_batch, valid_signature
+
+
+_mobiles = itertools.count(1)
+
+HERE = (Decimal("12.971599"), Decimal("77.594566"))
+
+GATEWAY_SECRET = "test-secret"
+
+
+def make_user(name, **fields):
+    fields.setdefault("role", "user")
+    return CustomerProfile.objects.create(
+        username=name, email=f"{name}@example.com", mobile=f"9{next(_mobiles):09d}", **fields
+    )
+
+
+def make_provider(name, latitude=HERE[0], longitude=HERE[1], **fields):
+    fields.setdefault("is_admin_verified", True)
+    fields.setdefault("service_km", 10)
+    return make_user(name, role="service_provider", latitude=latitude, longitude=longitude, **fields)
+
+
+def make_service(name, price="499.00", category=None):
+    category = category or Category.objects.get_or_create(category_name="Home")[0]
+    return SubCategory.objects.create(
+        name=name, category=category, description="d", section="new", steps="s", faqs="f",
+        price=None if price is None else Decimal(price),
+    )
+
+
+def make_payment(user, amount="250.00"):
+    booking = ServiceBook.objects.create(user=user)
+    return Payment.objects.create(booking=booking, user=user, amount=Decimal(amount))
+
+
+class GatewayTestCase(TestCase):
+    """Talks to an in-process StandInGateway."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gateway = StandInGateway(GATEWAY_SECRET).start()
+        cls.addClassCleanup(cls.gateway.stop)
+        cls.enterClassContext(override_settings(
+            RAZORPAY_BASE_URL=cls.gateway.url, RAZORPAY_KEY_ID="rzp_test", RAZORPAY_KEY_SECRET=GATEWAY_SECRET,
+            RAZORPAY_WEBHOOK_SECRET=GATEWAY_SECRET,
+        ))
+
+    def setUp(self):
+        # receipts repeat across tests, the database reuses payment ids
+        self.gateway.orders.clear()
+        self.gateway.payments.clear()
+        self.gateway.payments_by_order.clear()
+        breaker.reset()
+        self.customer = make_user("customer")
+
+
+class IndexSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider = make_provider("provider")
+        # two workers' copies of the same index
+        self.first, self.second = ProviderIndex(), ProviderIndex()
+
+    def nearby(self, index):
+        return [provider_id for _, provider_id in index.nearest(*HERE)]
+
+    def test_index_base_is_abstract(self):
+        with self.assertRaises(TypeError):
+            SyncedIndex()
+
+    def test_change_is_replayed_by_other_worker(self):
+        self.assertEqual(self.nearby(self.first), [self.provider.pk])
+        self.assertEqual(self.nearby(self.second), [self.provider.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.latitude = Decimal("13.500000")
+            self.provider.save()
+
+        self.assertEqual(self.nearby(self.second), [])
+        self.assertEqual((self.second.rebuilds, self.second.replayed), (1, 1))
+
+    def test_blocked_provider_drops_out(self):
+        self.assertEqual(self.nearby(self.second), [self.provider.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.is_blocked = True
+            self.provider.save()
+        self.assertEqual(self.nearby(self.second), [])
+
+    def test_rebuild_all_and_lost_log_entries_rebuild(self):
+        self.nearby(self.second)
+        with self.captureOnCommitCallbacks(execute=True):
+            providers_changed()
+        self.nearby(self.second)
+        self.assertEqual(self.second.rebuilds, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.service_km = 20
+            self.provider.save()
+        cache.delete(CHANGE_KEY.format(current_version()))
+        self.nearby(self.second)
+        self.assertEqual((self.second.rebuilds, self.second.replayed), (3, 0))
+
+
+class ProviderArraysTests(SimpleTestCase):
+    rows = [
+        # id, latitude, longitude, service_km, experience_year, load
+        (3, 12.97, 77.59, 10, 2, 0),
+        (1, 12.98, 77.60, None, 8, 0),
+        (7, None, None, 10, 5, 0),
+        (5, 13.30, 77.59, 10, 10, 0),
+    ]
+
+    def test_rows_without_location_are_skipped(self):
+        arrays = ProviderArrays.from_rows(self.rows)
+        self.assertEqual(arrays.ids.tolist(), [1, 3, 5])
+
+    def test_positions_drop_missing_ids(self):
+        arrays = ProviderArrays.from_rows(self.rows)
+        self.assertEqual(arrays.ids[arrays.positions([5, 7, 1, 99])].tolist(), [5, 1])
+        self.assertEqual(len(arrays.positions([7])), 0)
+
+    def test_rank_within_radius(self):
+        arrays = ProviderArrays.from_rows(self.rows)
+        ranked = arrays.rank(12.97, 77.59, k=5)
+        # provider 5 is about 37 km away, outside its 10 km radius
+        self.assertEqual([provider_id for provider_id, _, _ in ranked], [1, 3])
+        self.assertEqual(arrays.rank(12.97, 77.59, among=arrays.positions([7, 99])), [])
+
+    def test_rank_matches_plain_loop(self):
+        rng = random.Random(7)
+        rows = [
+            (i, rng.uniform(12, 14), rng.uniform(77, 79), rng.choice([5.0, 20.0, 50.0]), rng.randint(0, 15),
+             rng.randint(0, 6))
+            for i in range(1, 2001)
+        ]
+        arrays = ProviderArrays.from_rows(rows)
+        for latitude, longitude in [(13.0, 78.0), (12.5, 77.5), (13.9, 78.9)]:
+            ranked = [provider_id for provider_id, _, _ in arrays.rank(latitude, longitude, k=10)]
+            self.assertEqual(ranked, naive_rank(rows, latitude, longitude, 10))
+
+
+class MatchProvidersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        provider_index.clear()
+        skill_index.clear()
+        category = Category.objects.create(category_name="Home")
+        self.plumbing = SubCategory.objects.create(
+            name="Pipe repair", category=category, description="d", section="new", steps="s", faqs="f", price="100.00",
+        )
+        self.wiring = SubCategory.objects.create(
+            name="Wiring", category=category, description="d", section="new", steps="s", faqs="f", price="100.00",
+        )
+        self.customer = make_user("customer", latitude=HERE[0], longitude=HERE[1])
+        self.near = make_provider("near", experience_year=1)
+        self.near.categories.add(self.plumbing)
+        self.far = make_provider("far", latitude=Decimal("13.020000"), service_km=20, experience_year=1)
+        self.far.categories.add(self.plumbing)
+        self.electrician = make_provider("electrician", service_skill="Electrical wiring")
+
+    def match(self, *services):
+        return match_providers(*HERE, services, exclude={self.customer.pk})
+
+    def test_nearest_skilled_provider_is_matched(self):
+        matched = self.match(self.plumbing, self.wiring)
+        self.assertEqual(matched, {self.plumbing.id: self.near.pk, self.wiring.id: self.electrician.pk})
+
+    def test_provider_blocked_since_index_sync_is_skipped(self):
+        self.assertEqual(self.match(self.plumbing)[self.plumbing.id], self.near.pk)
+        # a queryset update sends no signal, so the indexes still list the provider
+        CustomerProfile.objects.filter(pk=self.near.pk).update(is_blocked=True)
+        self.assertEqual(self.match(self.plumbing), {self.plumbing.id: self.far.pk})
+        CustomerProfile.objects.filter(pk=self.far.pk).update(latitude=None, longitude=None)
+        self.assertEqual(self.match(self.plumbing), {})
+
+    def test_no_location_no_match(self):
+        self.assertEqual(match_providers(None, None, [self.plumbing]), {})
+
+
+class DirtyFieldsMixinTests(TestCase):
+    def setUp(self):
+        self.user = make_user("dirty", image_variants={"thumb": "a.webp"})
+
+    def updated_columns(self, instance):
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        return {column for column in ("username", "email", "image_variants", "updated_date") if f'"{column}" =' in updates[0]}
+
+    def test_json_edited_in_place_is_saved(self):
+        user = CustomerProfile.objects.get(pk=self.user.pk)
+        user.image_variants["card"] = "b.webp"
+        self.assertEqual(user.get_dirty_fields(), ["image_variants"])
+        user.save()
+        self.assertEqual(CustomerProfile.objects.get(pk=self.user.pk).image_variants, {"thumb": "a.webp", "card": "b.webp"})
+
+    def test_assigned_deferred_field_is_saved(self):
+        user = CustomerProfile.objects.only("id").get(pk=self.user.pk)
+        user.username = "renamed"
+        self.assertEqual(self.updated_columns(user), {"username", "updated_date"})
+        self.assertEqual(CustomerProfile.objects.get(pk=self.user.pk).username, "renamed")
+
+    def test_deferred_field_loaded_on_access_is_clean(self):
+        user = CustomerProfile.objects.defer("email").get(pk=self.user.pk)
+        self.assertEqual(user.email, "dirty@example.com")
+        self.assertEqual(user.get_dirty_fields(), [])
+        self.assertEqual(self.updated_columns(user), {"updated_date"})
+
+    def test_refresh_from_db_resets_snapshot(self):
+        user = CustomerProfile.objects.get(pk=self.user.pk)
+        CustomerProfile.objects.filter(pk=self.user.pk).update(username="elsewhere")
+        user.refresh_from_db()
+        self.assertEqual(user.get_dirty_fields(), [])
+        user.username = "dirty"
+        self.assertEqual(user.get_dirty_fields(), ["username"])
+
+
+class OutboxDispatchTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = make_payment(self.customer)
+        self.outbox = enqueue_order(self.payment)
+
+    def retry_after_lost_answer(self):
+        # the first attempt reached the gateway, but its answer never came back
+        PaymentOrderOutbox.objects.filter(id=self.outbox.id).update(attempts=1)
+        return dispatch_order(self.outbox.id)
+
+    def test_order_created_and_recorded(self):
+        outbox = dispatch_order(self.outbox.id)
+        self.assertEqual(outbox.status, PaymentOrderOutbox.SENT)
+        self.payment.refresh_from_db()
+        self.assertEqual(list(self.gateway.orders), [self.payment.order_id])
+        self.assertIsNone(dispatch_order(self.outbox.id))
+
+    def test_retry_adopts_order_paid_meanwhile(self):
+        _, order = self.gateway.create_order(self.outbox.payload)
+        self.gateway.pay(order["id"], {})
+        outbox = self.retry_after_lost_answer()
+        self.assertEqual(outbox.status, PaymentOrderOutbox.SENT)
+        self.assertEqual(outbox.payment.order_id, order["id"])
+        self.assertEqual(len(self.gateway.orders), 1)
+
+    def test_receipt_with_other_amount_fails_the_order(self):
+        self.gateway.create_order({**self.outbox.payload, "amount": self.outbox.payload["amount"] + 100})
+        with self.assertLogs("customer.payments", "ERROR"):
+            outbox = self.retry_after_lost_answer()
+        self.assertEqual(outbox.status, PaymentOrderOutbox.FAILED)
+        self.assertIn("OrderConflict", outbox.last_error)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "failed")
+        self.assertEqual(len(self.gateway.orders), 1)
+
+    def test_unreachable_gateway_is_retried_later(self):
+        with override_settings(RAZORPAY_BASE_URL="http://127.0.0.1:9"), self.assertLogs("customer.payments", "WARNING"):
+            outbox = dispatch_order(self.outbox.id)
+        self.assertEqual((outbox.status, outbox.attempts), (PaymentOrderOutbox.PENDING, 1))
+        self.assertGreater(outbox.next_attempt_at, self.outbox.next_attempt_at)
+        self.assertIsNone(dispatch_order(self.outbox.id))
+
+
+class RecordingView(APIView):
+    """Runs `behaviour` for each request that gets through @idempotent."""
+
+    behaviour = None
+
+    @idempotent
+    def post(self, request):
+        return self.behaviour(request)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = make_user("customer")
+        self.user.is_authenticated = True
+        self.calls = []
+        self.status = 201
+
+    def behaviour(self, request):
+        self.calls.append(request.data)
+        return Response({"call": len(self.calls)}, status=self.status)
+
+    def post(self, data, key="key-1"):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        request = APIRequestFactory().post("/checkout/", data, format="json", **headers)
+        force_authenticate(request, user=self.user)
+        return RecordingView.as_view(behaviour=self.behaviour)(request)
+
+    def test_repeat_replays_stored_response(self):
+        first, second = self.post({"booking_id": 1}), self.post({"booking_id": 1})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((second.status_code, second.data), (201, {"call": 1}))
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first.headers)
+
+    def test_key_reused_for_other_request(self):
+        self.post({"booking_id": 1})
+        self.assertEqual(self.post({"booking_id": 2}).status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_without_key_every_request_runs(self):
+        self.post({"booking_id": 1}, key=None)
+        self.post({"booking_id": 1}, key=None)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_retry_statuses_are_not_stored(self):
+        self.status = 503
+        self.post({"booking_id": 1})
+        self.status = 201
+        self.assertEqual(self.post({"booking_id": 1}).data, {"call": 2})
+
+    def test_response_not_stored_after_losing_the_lease(self):
+        behaviour = self.behaviour
+
+        def overrun(request):
+            # the lease ran out mid-request and a retry took the key over
+            IdempotencyKey.objects.update(locked_until=timezone.now() + timedelta(minutes=5))
+            return behaviour(request)
+
+        self.behaviour = overrun
+        with self.assertLogs("customer.idempotency", "WARNING"):
+            self.assertEqual(self.post({"booking_id": 1}).status_code, 201)
+        record = IdempotencyKey.objects.get()
+        self.assertEqual((record.status, record.response_body), (IdempotencyKey.IN_PROGRESS, None))
+
+
+@override_settings(PAYMENT_GATEWAY={"BREAKER_FAILURES": 2, "BREAKER_RESET": 0.05})
+class CircuitBreakerTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.breaker = CircuitBreaker()
+        self.session = GatewaySession(self.breaker, self.gateway.url)
+        self.addCleanup(self.session.close)
+
+    def call(self, url=None):
+        return self.session.get(url or f"{self.gateway.url}/standin/stats")
+
+    def open_circuit(self):
+        with self.assertLogs("customer.gateway", "WARNING"):
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    self.call("http://127.0.0.1:9/")
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        self.call()
+        self.open_circuit()
+        with self.assertRaises(GatewayUnavailable):
+            self.call()
+        self.assertEqual(self.breaker.failures, 2)
+
+    def test_one_trial_when_half_open(self):
+        self.open_circuit()
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, "half-open")
+        self.breaker.before_call()
+        with self.assertRaises(GatewayUnavailable):
+            self.call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_failed_trial_reopens(self):
+        self.open_circuit()
+        time.sleep(0.06)
+        with self.assertLogs("customer.gateway", "WARNING"), self.assertRaises(requests.ConnectionError):
+            self.call("http://127.0.0.1:9/")
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_unexpected_error_in_trial_does_not_wedge_the_circuit(self):
+        self.open_circuit()
+        time.sleep(0.06)
+        with mock.patch.object(requests.Session, "request", side_effect=RuntimeError("boom")):
+            with self.assertLogs("customer.gateway", "WARNING"), self.assertRaises(RuntimeError):
+                self.call()
+        time.sleep(0.06)
+        self.assertEqual(self.call().status_code, 200)
+        self.assertEqual(self.breaker.state, "closed")
+
+
+@override_settings(RAZORPAY_KEY_ID="rzp_test", RAZORPAY_KEY_SECRET=GATEWAY_SECRET, RAZORPAY_WEBHOOK_SECRET=GATEWAY_SECRET)
+class PaymentConfirmationTests(TestCase):
+    def setUp(self):
+        self.customer = make_user("customer")
+        self.payment = make_payment(self.customer)
+        Payment.objects.filter(id=self.payment.id).update(order_id="order_1")
+
+    def client_for(self, user):
+        user.is_authenticated = True
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def verify(self, user, signature=None):
+        return self.client_for(user).post("/api/customer/razorpay/verify-payment/", {
+            "razorpay_order_id": "order_1", "razorpay_payment_id": "pay_1",
+            "razorpay_signature": signature or payment_signature("order_1", "pay_1", GATEWAY_SECRET),
+        }, format="json")
+
+    def webhook(self, event, signature=None, event_id="evt_1"):
+        body = json.dumps(event).encode()
+        signature = signature or hmac.new(GATEWAY_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        return APIClient().post(
+            "/api/customer/razorpay/webhook/", body, content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def captured(self, status="captured", amount=25000):
+        return {"event": f"payment.{status}", "payload": {"payment": {"entity": {
+            "id": "pay_1", "order_id": "order_1", "status": status, "method": "upi", "amount": amount,
+        }}}}
+
+    def test_verify_with_signature(self):
+        response = self.verify(self.customer)
+        self.assertEqual((response.status_code, response.data["data"]["status"]), (200, "success"))
+        self.assertEqual(self.verify(self.customer).data["message"], "Payment already verified")
+
+    def test_verify_rejects_bad_signature(self):
+        self.assertEqual(self.verify(self.customer, signature="0" * 64).status_code, 400)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+
+    def test_verify_only_touches_own_payment(self):
+        self.assertEqual(self.verify(make_user("someone-else")).status_code, 404)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+
+    def test_webhook_signature(self):
+        body = b'{"event": "payment.captured"}'
+        self.assertTrue(valid_signature(body, hmac.new(GATEWAY_SECRET.encode(), body, hashlib.sha256).hexdigest()))
+        self.assertFalse(valid_signature(body, "0" * 64))
+        self.assertFalse(valid_signature(body, None))
+        with override_settings(RAZORPAY_WEBHOOK_SECRET=None):
+            self.assertFalse(valid_signature(body, "0" * 64))
+        self.assertEqual(self.webhook(self.captured(), signature="0" * 64).status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+    def test_webhook_events_stored_once_and_applied(self):
+        self.assertEqual(self.webhook(self.captured()).status_code, 200)
+        self.assertEqual(self.webhook(self.captured()).status_code, 200)
+        self.webhook(self.captured("failed"), event_id="evt_2")
+        self.assertEqual(process_batch(), 2)
+        self.payment.refresh_from_db()
+        # a failed attempt never undoes a success
+        self.assertEqual((self.payment.status, self.payment.payment_id, self.payment.method), ("success", "pay_1", "upi"))
+        self.assertEqual(process_batch(), 0)
+
+    def test_webhook_amount_mismatch_is_left_for_review(self):
+        self.webhook(self.captured(amount=20000))
+        with self.assertLogs("customer.webhooks", "WARNING"):
+            self.assertEqual(process_batch(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.payment_id), ("pending", None))
+        event = PaymentWebhookEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, "amount mismatch (review): expected 25000 paise, pay_1 captured 20000")
+
+
+class ReconciliationTests(GatewayTestCase):
+    def order_for(self, payment, amount=None, paid=None):
+        _, order = self.gateway.create_order({"amount": amount or int(payment.amount * 100), "receipt": f"payment-{payment.id}"})
+        if paid:
+            self.gateway.pay(order["id"], {"status": paid})
+        Payment.objects.filter(id=payment.id).update(order_id=order["id"])
+        return payment
+
+    def reconcile(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        out = io.StringIO()
+        call_command("reconcile_payments", "--min-age", "0", "--workers", "2",
+                     "--checkpoint", f"{directory.name}/checkpoint.json", stdout=out)
+        return out.getvalue()
+
+    def status(self, payment):
+        payment.refresh_from_db()
+        return payment.status
+
+    def test_settles_what_the_gateway_settled(self):
+        captured = self.order_for(make_payment(self.customer), paid="captured")
+        failed = self.order_for(make_payment(self.customer), paid="failed")
+        unpaid = self.order_for(make_payment(self.customer))
+        output = self.reconcile()
+        self.assertEqual([self.status(captured), self.status(failed), self.status(unpaid)], ["success", "failed", "pending"])
+        self.assertEqual(captured.payment_id, self.gateway.payments_by_order[captured.order_id][0]["id"])
+        self.assertIn("Scanned 3 pending payments", output)
+
+    def test_amount_mismatch_is_left_for_review(self):
+        payment = self.order_for(make_payment(self.customer, "250.00"), amount=20000, paid="captured")
+        with self.assertLogs("customer.reconciliation", "WARNING"):
+            output = self.reconcile()
+        self.assertEqual(self.status(payment), "pending")
+        self.assertIn("amount mismatch (review)", output)
+        self.assertIn("expected 25000 paise", output)
+
+
+class OTPStoreTests:
+    backend = None
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(override_settings(OTP_STORE={"BACKEND": self.backend, "TTL": {"payment": 0}}))
+        # get_otp_store() is cached, it has to forget the store built for the previous settings
+        get_otp_store.cache_clear()
+        self.addCleanup(get_otp_store.cache_clear)
+        self.store = get_otp_store()
+
+    def test_backend_follows_settings(self):
+        self.assertEqual(f"{type(self.store).__module__}.{type(self.store).__name__}", self.backend)
+
+    def test_issue_and_verify(self):
+        code = self.store.issue("login", 7)
+        self.assertEqual(self.store.get("login", "7"), code)
+        self.assertTrue(self.store.verify("login", 7, code))
+        self.assertFalse(self.store.verify("login", 7, "000000"))
+        self.assertFalse(self.store.verify("login", 7, None))
+        self.assertFalse(self.store.verify("register", 7, code))
+
+    def test_reissue_replaces_the_code(self):
+        with mock.patch("customer.otp.generate_code", side_effect=["111111", "222222"]):
+            self.store.issue("login", 7)
+            self.store.issue("login", 7)
+        self.assertEqual(self.store.get("login", 7), "222222")
+        self.assertFalse(self.store.verify("login", 7, "111111"))
+
+    def test_consumed_code_is_single_use(self):
+        code = self.store.issue("login", 7)
+        self.store.consume("login", 7)
+        self.assertFalse(self.store.verify("login", 7, code))
+
+    def test_expired_code_is_rejected(self):
+        code = self.store.issue("payment", 7)
+        self.assertIsNone(self.store.get("payment", 7))
+        self.assertFalse(self.store.verify("payment", 7, code))
+
+
+class DatabaseOTPStoreTests(OTPStoreTests, TestCase):
+    backend = "customer.otp.DatabaseOTPStore"
+
+    def test_purge_removes_only_expired_rows(self):
+        self.store.issue("login", 1)
+        for booking_id in range(3):
+            self.store.issue("payment", booking_id)
+        out = io.StringIO()
+        call_command("purge_expired_otps", "--chunk-size", "2", stdout=out)
+        self.assertIn("Deleted 3 expired OTPs.", out.getvalue())
+        self.assertEqual(list(OneTimePassword.objects.values_list("purpose", flat=True)), ["login"])
+
+
+class CacheOTPStoreTests(OTPStoreTests, TestCase):
+    backend = "customer.otp.CacheOTPStore"
+
+    def test_nothing_written_to_the_database(self):
+        self.store.issue("login", 7)
+        self.assertFalse(OneTimePassword.objects.exists())
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.customer = make_user("customer")
+        self.customer.is_authenticated = True
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+        self.cart = Cart.objects.create(user=self.customer)
+
+    def add(self, service, qty=1):
+        return ServiceCart.objects.create(
+            cart=self.cart, service=service, qty=qty, price=service.price, total_price=qty * service.price,
+        )
+
+    def test_prices_are_json_numbers(self):
+        self.add(make_service("Painting", "499.50"), qty=2)
+        data = self.client.get("/api/customer/cart/").json()["data"]
+        self.assertEqual((data["items"][0]["price"], data["items"][0]["total_price"]), (499.5, 999.0))
+        self.assertEqual(data["total"], 999.0)
+
+    def bulk(self, *items):
+        """POST (service, qty[, num_of_tech]) operations to the bulk cart endpoint."""
+        items = [dict(zip(("service", "qty", "num_of_tech"), item)) for item in items]
+        return self.client.post("/api/customer/cart/bulk/", {"items": items}, format="json")
+
+    def lines(self):
+        return {item.service_id: (item.qty, item.num_of_tech, item.total_price) for item in self.cart.services.all()}
+
+    def test_bulk_adds_updates_and_removes_in_one_request(self):
+        kept, updated, removed, added = (make_service(name, "100.00") for name in ("Kept", "Updated", "Removed", "Added"))
+        for service in (kept, updated, removed):
+            self.add(service)
+        response = self.bulk((updated.id, 3, 2), (removed.id, 0), (added.id, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {
+            kept.id: (1, 1, Decimal("100.00")), updated.id: (3, 2, Decimal("600.00")), added.id: (1, 1, Decimal("100.00")),
+        })
+        data = response.json()["data"]
+        self.assertEqual((data["added"], data["updated"], data["removed"]), (1, 1, 1))
+        # the total is over the whole cart, not just the lines in the request
+        self.assertEqual(data["total"], 800.0)
+        self.assertEqual(len(data["items"]), 3)
+
+    def test_service_listed_twice_takes_the_last_entry(self):
+        service = make_service("Painting", "100.00")
+        self.bulk((service.id, 2), (service.id, 5))
+        self.assertEqual(self.lines(), {service.id: (5, 1, Decimal("500.00"))})
+        self.bulk((service.id, 4), (service.id, 0))
+        self.assertEqual(self.lines(), {})
+
+    def test_unknown_or_unpriced_service_changes_nothing(self):
+        priced, unpriced = make_service("Painting", "100.00"), make_service("Legacy", None)
+        response = self.bulk((priced.id, 1), (999999, 1))
+        self.assertEqual((response.status_code, response.json()["errors"]), (404, {"services": [999999]}))
+        response = self.bulk((priced.id, 1), (unpriced.id, 1))
+        self.assertEqual((response.status_code, response.json()["errors"]), (400, {"services": [unpriced.id]}))
+        self.assertEqual(self.lines(), {})
+        # removing an unpriced legacy line is still allowed
+        self.assertEqual(self.bulk((unpriced.id, 0)).status_code, 200)
+
+    def test_failure_midway_rolls_the_whole_request_back(self):
+        existing, added = make_service("Existing", "100.00"), make_service("Added", "100.00")
+        self.add(existing)
+        with mock.patch.object(ServiceCart.objects, "bulk_update", side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                self.bulk((existing.id, 4), (added.id, 1))
+        self.assertEqual(self.lines(), {existing.id: (1, 1, Decimal("100.00"))})
+
+
+@override_settings(SYSTEM_LOG_BUFFER={"ENABLED": True, "MAX_SIZE": 3, "BATCH_SIZE": 2, "FLUSH_INTERVAL": 60})
+class SystemLogBufferTests(TestCase):
+    def setUp(self):
+        # no writer thread, the tests flush on this connection themselves
+        self.enterContext(mock.patch.object(SystemLogBuffer, "_run"))
+        self.buffer = SystemLogBuffer()
+        self.user = make_user("auditor")
+
+    def test_flush_writes_in_batches(self):
+        for n in range(3):
+            self.buffer.log("login", self.user, f"entry {n}")
+        self.assertFalse(SystemLog.objects.exists())
+        with self.assertNumQueries(2):
+            self.buffer.flush()
+        self.assertEqual(sorted(SystemLog.objects.values_list("remark", flat=True)), ["entry 0", "entry 1", "entry 2"])
+
+    def test_created_date_is_when_logged(self):
+        logged_at = timezone.now() - timedelta(minutes=5)
+        with mock.patch("customer.audit.timezone.now", return_value=logged_at):
+            self.buffer.log("login", self.user)
+        self.buffer.flush()
+        self.assertEqual(SystemLog.objects.get().created_date, logged_at)
+
+    def test_full_queue_writes_directly(self):
+        for n in range(4):
+            self.buffer.log("login", self.user, f"entry {n}")
+        self.assertEqual(list(SystemLog.objects.values_list("remark", flat=True)), ["entry 3"])
+        self.buffer.flush()
+        self.assertEqual(SystemLog.objects.count(), 4)
+
+    def test_failed_batch_is_written_row_by_row(self):
+        self.buffer.log("login", self.user, "first")
+        self.buffer.log("login", None, "second")
+        with mock.patch.object(SystemLog.objects, "bulk_create", side_effect=DatabaseError("boom")):
+            with self.assertLogs("customer.audit", "ERROR"):
+                self.buffer.flush()
+        self.assertEqual(sorted(SystemLog.objects.values_list("remark", flat=True)), ["first", "second"])
+
+    @override_settings(SYSTEM_LOG_BUFFER={"ENABLED": False})
+    def test_disabled_buffer_writes_directly(self):
+        self.buffer.log("login", self.user)
+        self.assertEqual(SystemLog.objects.count(), 1)
+
+
+class ArchiveSystemLogsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        this_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self.last_month = this_month - timedelta(days=20)
+        self.old = [SystemLog.objects.create(type="login", remark=f"old {n}", created_date=self.last_month)
+                    for n in range(3)]
+        self.current = SystemLog.objects.create(type="login", remark="current", created_date=this_month)
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command("archive_system_logs", "--older-than-days", "0", "--output-dir", str(self.directory),
+                     "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_past_month_archived_then_deleted(self):
+        output = self.archive()
+        self.assertIn(f"{self.last_month:%Y-%m}: archived 3, deleted 3", output)
+        path = self.directory / f"system_log_{self.last_month:%Y_%m}.jsonl.gz"
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual([row["id"] for row in rows], [entry.id for entry in self.old])
+        self.assertEqual(rows[0]["remark"], "old 0")
+        # the current month is still being written to and stays put
+        self.assertEqual(list(SystemLog.objects.all()), [self.current])
+        self.assertEqual([path.name for path in self.directory.iterdir()], [path.name])
+
+    def test_dry_run_changes_nothing(self):
+        self.assertIn(f"{self.last_month:%Y-%m}: 3 rows would be archived", self.archive("--dry-run"))
+        self.assertEqual(SystemLog.objects.count(), 4)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+
+class DetectDeviceTests(SimpleTestCase):
+    def setUp(self):
+        _detect.cache_clear()
+        self.addCleanup(_detect.cache_clear)
+
+    def test_known_user_agents(self):
+        android, iphone, windows = DEFAULT_WARMUP_USER_AGENTS[1:]
+        self.assertEqual(detect_device(android), DeviceInfo("Mobile", "Android", "Chrome Mobile"))
+        self.assertEqual(detect_device(iphone).device_type, "Mobile")
+        self.assertEqual(detect_device(windows), DeviceInfo("PC", "Windows", "Chrome"))
+        self.assertEqual(detect_device("Googlebot/2.1 (+http://www.google.com/bot.html)").device_type, "Bot")
+
+    def test_unknown_and_empty_user_agents(self):
+        for user_agent in ("", None, "garbage-agent/1.0"):
+            with self.subTest(user_agent=user_agent):
+                self.assertEqual(detect_device(user_agent), DeviceInfo("PC", "Other", "Other"))
+
+    def test_parse_is_cached_per_user_agent(self):
+        with mock.patch("customer.devices.parse", wraps=user_agents.parse) as parse:
+            for _ in range(3):
+                detect_device("okhttp/4.12.0")
+            detect_device("")
+            detect_device(None)
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual(device_cache_stats()["hits"], 3)
+
+    def test_long_user_agents_share_one_entry(self):
+        prefix = "x" * MAX_USER_AGENT_LENGTH
+        detect_device(prefix + "a")
+        detect_device(prefix + "b")
+        self.assertEqual((device_cache_stats()["entries"], device_cache_stats()["hits"]), (1, 1))
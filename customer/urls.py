@@ -14,9 +14,15 @@ urlpatterns = [
     path('subcategories/', SubCategoryView.as_view()),
     path('categories/<int:category_id>/subcategories/', SubCategoryView.as_view()),
     path('subcategories/<int:subcategory_id>/items/', SubCategoryItemView.as_view()),
+    path('services/search/', ServiceSearchView.as_view()),
+    path('catalog/tree/', CatalogTreeView.as_view()),
+    path('sections/<str:section>/', SectionFeedView.as_view()),
     path("cart/", CartView.as_view()),
     path("cart/<int:item_id>/", CartView.as_view()),
+    path("cart/bulk/", CartBulkView.as_view()),
     path('payment/otp/', GeneratePaymentOTPView.as_view(), name='payment-generate-otp'),
     path('payment/checkout/', RazorpayCheckoutView.as_view(), name='razorpay-checkout'),
+    path('payment/<int:payment_id>/order/', PaymentOrderStatusView.as_view(), name='payment-order-status'),
     path("razorpay/verify-payment/", RazorpayVerifyPaymentView.as_view(), name="razorpay-verify-payment"),
+    path("razorpay/webhook/", RazorpayWebhookView.as_view(), name="razorpay-webhook"),
 ]
\ No newline at end of file
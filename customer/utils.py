@@ -1,89 +1,54 @@
+from django.conf import settings
+
 from .models import *
 
-def create_booking_notifications(user_profile, service_provider_profile, booking):
+def create_booking_notifications(bookings):
     """
-    Creates booking notifications for both the customer and the service provider,
-    and includes related party info.
-    Returns: (user_notification, service_provider_notification) as dicts.
+    Creates booking notifications for both the customer and the assigned
+    service provider of each booking, one INSERT per
+    CHECKOUT_BATCH_SIZE bookings.
+    Returns: one {"user_notification", "service_provider_notification"} dict per booking.
     """
-    # For the customer
-    user_notification = Notification.objects.create(
-        user=user_profile,
-        service_provider=service_provider_profile,
-        recipient_type='user',
-        title='Booking Confirmed',
-        message=f"Your booking for '{booking.service.name}' has been confirmed. OTP: {booking.service_start_otp}",
-        type='booking',
-        channel='app',
-        is_sent=True
-    )
-
-    # For the service provider
-    service_provider_notification = Notification.objects.create(
-        service_provider=service_provider_profile,
-        user=user_profile,
-        recipient_type='service_provider',
-        title='Service Booked For You',
-        message=f"You have been assigned a service for '{booking.service.name}'",
-        type='booking',
-        channel='app',
-        is_sent=True
-    )
+    notifications = []
+    for booking in bookings:
+        # For the customer
+        notifications.append(Notification(
+            user=booking.user,
+            service_provider=booking.assigned_technician,
+            recipient_type='user',
+            title='Booking Confirmed',
+            message=f"Your booking for '{booking.service.name}' has been confirmed. OTP: {booking.service_start_otp}",
+            type='booking',
+            channel='app',
+            is_sent=True
+        ))
+        # For the service provider
+        notifications.append(Notification(
+            service_provider=booking.assigned_technician,
+            user=booking.user,
+            recipient_type='service_provider',
+            title='Service Booked For You',
+            message=f"You have been assigned a service for '{booking.service.name}'",
+            type='booking',
+            channel='app',
+            is_sent=True
+        ))
+    # two rows per booking
+    Notification.objects.bulk_create(notifications, batch_size=2 * settings.CHECKOUT_BATCH_SIZE)
 
     # Return serialized versions
-    return {
-        "user_notification": {
-            "id": user_notification.id,
-            "title": user_notification.title,
-            "message": user_notification.message
-        },
-        "service_provider_notification": {
-            "id": service_provider_notification.id,
-            "title": service_provider_notification.title,
-            "message": service_provider_notification.message
+    return [
+        {
+            "user_notification": {
+                "id": user_notification.id,
+                "title": user_notification.title,
+                "message": user_notification.message
+            },
+            "service_provider_notification": {
+                "id": service_provider_notification.id,
+                "title": service_provider_notification.title,
+                "message": service_provider_notification.message
+            }
         }
-    }
-
-
-# def find_matching_electrician(self, service_name, address, km_limit):
-#     electricians = CustomerProfile.objects.filter(role='electrician')
-
-#     service_keywords = [word.strip().lower() for word in service_name.split() if word.strip()]
-
-#     for electrician in electricians:
-#         if electrician.service_skill:
-#             skill_keywords = []
-#             for skill_phrase in electrician.service_skill.split(','):
-#                 skill_keywords.extend(skill_phrase.strip().lower().split())
-
-#             if any(word in skill_keywords for word in service_keywords):
-#                 if electrician.latitude and electrician.longitude:
-#                     distance = self.get_distance(
-#                         (address.latitude, address.longitude),
-#                         (electrician.latitude, electrician.longitude)
-#                     )
-#                     if distance <= km_limit:
-#                         return electrician
-#     return None
-
-# def get_distance(self, origin, destination):
-#     """
-#     Uses Google Maps Distance Matrix API to get distance in km
-#     """
-#     import requests
-#     import math
-#     from django.conf import settings
-
-#     api_key = settings.GOOGLE_MAPS_API_KEY
-#     url = f"https://maps.googleapis.com/maps/api/distancematrix/json"
-#     params = {
-#         "origins": f"{origin[0]},{origin[1]}",
-#         "destinations": f"{destination[0]},{destination[1]}",
-#         "key": api_key
-#     }
-#     response = requests.get(url, params=params).json()
-#     try:
-#         meters = response["rows"][0]["elements"][0]["distance"]["value"]
-#         return meters / 1000  # in km
-#     except:
-#         return math.inf
\ No newline at end of file
+        for user_notification, service_provider_notification in zip(notifications[::2], notifications[1::2])
+    ]
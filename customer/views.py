@@ -6,15 +6,24 @@ from .models import *
 from django.shortcuts import get_object_or_404
 from .serializers import *
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from admin_panel.authentication import tokens_for_user
 import re
-from user_agents import parse
+from .devices import detect_device
+from .audit import system_log
 from rest_framework.permissions import IsAuthenticated
 from admin_panel.models import SubCategory
 import razorpay
 from django.conf import settings
 from .utils import create_booking_notifications
+from .otp import get_otp_store
+from .payments import dispatch_order, enqueue_order
+from .gateway import get_client
+from .idempotency import idempotent
+from .matching import match_providers
+from .webhooks import EVENT_ID_HEADER, SIGNATURE_HEADER, record_event, valid_signature
+from admin_panel.conditional import Validators
 from django.db import transaction
+from django.db.models import Sum
 from decimal import Decimal
 
 
@@ -53,7 +62,7 @@ class RegisterAPIView(APIView):
                 }, status=400)
 
             # Create OTP
-            otp = customer.create_otp()
+            otp = customer.create_otp('register')
 
             return Response({
                 "status": 200,
@@ -80,10 +89,10 @@ class VerifyOTPAPIView(APIView):
         except CustomerProfile.DoesNotExist:
             return Response({"status": 404, "message": "User not found"}, status=404)
 
-        if not customer.is_otp_valid():
+        if not customer.is_otp_valid('register'):
             return Response({"status": 400, "message": "OTP expired"}, status=400)
 
-        if customer.otp_verify(otp_entered):
+        if customer.otp_verify(otp_entered, 'register'):
             customer.is_verified = True
             customer.save()
             return Response({"status": 200, "message": "OTP verified successfully"})
@@ -107,10 +116,10 @@ class VerifyOTPAPIView(APIView):
         except CustomerProfile.DoesNotExist:
             return Response({"status": 404, "message": "User not found"}, status=404)
 
-        if not customer.is_otp_valid():
+        if not customer.is_otp_valid('register'):
             return Response({"status": 400, "message": "OTP expired"}, status=400)
 
-        if customer.otp_verify(otp_entered):
+        if customer.otp_verify(otp_entered, 'register'):
             customer.is_verified = True
             customer.save()
             return Response({"status": 200, "message": "OTP verified successfully"})
@@ -134,15 +143,16 @@ class GenerateOTPAPIView(APIView):
             return Response({"status": 404, "message": "User not found"}, status=404)
 
         # Check OTP validity
-        if customer.is_otp_valid():
+        current_otp = customer.current_otp('register')
+        if current_otp:
             return Response({
                 "status": 200,
                 "message": "OTP already sent and still valid",
-                "otp": customer.otp
+                "otp": current_otp
             })
 
         # Generate new OTP
-        otp = customer.create_otp()
+        otp = customer.create_otp('register')
 
         return Response({
             "status": 200,
@@ -173,11 +183,12 @@ class LoginSendOTPView(APIView):
             return Response({"status": 404, "message": "User not found"}, status=404)
 
         # Check if OTP is still valid
-        if user.is_otp_valid():
+        current_otp = user.current_otp()
+        if current_otp:
             return Response({
                 "status": 200,
                 "message": "OTP already sent and still valid",
-                "otp": user.otp  # ⚠️ remove in production
+                "otp": current_otp  # ⚠️ remove in production
             }, status=200)
 
         # Generate new OTP using model method
@@ -217,37 +228,25 @@ class LoginVerifyOTPView(APIView):
         if not user.otp_verify(otp_entered):
             return Response({"status": 400, "message": "Invalid OTP"}, status=400)
 
-        # OTP verified → clear OTP fields
-        user.otp = None
-        user.otp_created_at = None
+        # OTP verified → clear OTP
+        user.clear_otp()
 
         if fcm_token:
             user.fcm_token = fcm_token
-        user.save()
+            user.save()
 
         # Device Detection
-        user_agent_str = request.META.get("HTTP_USER_AGENT", "")
-        user_agent = parse(user_agent_str)
-        device_type = "PC"
-        if user_agent.is_mobile:
-            device_type = "Mobile"
-        elif user_agent.is_tablet:
-            device_type = "Tablet"
-        elif user_agent.is_bot:
-            device_type = "Bot"
-
-        os_name = user_agent.os.family
-        browser = user_agent.browser.family
+        device_type, os_name, browser = detect_device(request.META.get("HTTP_USER_AGENT", ""))
 
         # Save login log
-        SystemLog.objects.create(
+        system_log.log(
             type="login",
             performed_by=user,
             remark=f"Login from {device_type} using {browser} on {os_name}"
         )
 
         # Generate JWT tokens directly
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         access = refresh.access_token
 
         return Response({
@@ -272,13 +271,20 @@ class CustomerProfileView(APIView):
 
     def get(self, request):
         """Retrieve the profile of the logged-in user"""
+        validators = Validators(
+            CustomerProfile.objects.filter(id=request.user.id), request.build_absolute_uri('/')
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return validators.apply(not_modified)
+
         profile = get_object_or_404(CustomerProfile, username=request.user.username)
         serializer = CustomerProfileSerializer(profile, context={'request': request})
-        return Response({
+        return validators.apply(Response({
             "status": 200,
             "message": "Profile retrieved",
             "data": serializer.data
-        })
+        }))
 
     # def post(self, request):
     #     """Create a profile for the logged-in user"""
@@ -325,8 +331,8 @@ class CartView(APIView):
                 "data": {"items": [], "total": 0}
             }, status=200)
 
-        items = ServiceCart.objects.filter(cart=cart)
-        total = sum(item.total_price for item in items)
+        items = list(ServiceCart.objects.filter(cart=cart).select_related("service"))
+        total = sum((item.total_price for item in items), Decimal("0.00"))
         data = ServiceCartSerializer(items, many=True).data
 
         return Response({
@@ -343,7 +349,12 @@ class CartView(APIView):
 
         user = request.user
         service = get_object_or_404(SubCategory, id=service_id)
-        price = float(service.price)
+        price = service.price
+        if price is None:
+            return Response({
+                "status": 400,
+                "message": "This service has no price yet"
+            }, status=400)
 
         cart, _ = Cart.objects.get_or_create(user=user)
         item, created = ServiceCart.objects.get_or_create(cart=cart, service=service)
@@ -363,9 +374,9 @@ class CartView(APIView):
     def patch(self, request, item_id=None):
         """Update cart item (qty or num_of_tech)"""
         user = request.user
-        item = get_object_or_404(ServiceCart, id=item_id)
+        item = get_object_or_404(ServiceCart.objects.select_related("cart", "service"), id=item_id)
 
-        if item.cart.user != user:
+        if item.cart.user_id != user.id:
             return Response({
                 "status": 403,
                 "message": "You do not have permission to update this item"
@@ -390,8 +401,8 @@ class CartView(APIView):
         user = request.user
 
         if item_id:  # Delete a single cart item
-            item = get_object_or_404(ServiceCart, id=item_id)
-            if item.cart.user != user:
+            item = get_object_or_404(ServiceCart.objects.select_related("cart"), id=item_id)
+            if item.cart.user_id != user.id:
                 return Response({
                     "status": 403,
                     "message": "You do not have permission to delete this item"
@@ -413,24 +424,104 @@ class CartView(APIView):
         }, status=200)
 
 
-class GeneratePaymentOTPView(APIView):
+class CartBulkView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        """
+        Apply a list of {service, qty, num_of_tech} operations to the cart in
+        one transaction. Services already in the cart are updated, new ones
+        added and qty 0 removes one; a service listed twice takes its last entry.
+        """
+        serializer = CartBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"status": 400, "message": "Invalid cart items", "errors": serializer.errors}, status=400)
+
+        operations = {op["service"]: op for op in serializer.validated_data["items"]}
+        services = SubCategory.objects.only("id", "price").in_bulk(list(operations))
+
+        missing = [service_id for service_id in operations if service_id not in services]
+        if missing:
+            return Response({"status": 404, "message": "Service not found", "errors": {"services": missing}}, status=404)
+        unpriced = [
+            service_id for service_id, op in operations.items()
+            if op["qty"] and services[service_id].price is None
+        ]
+        if unpriced:
+            return Response({
+                "status": 400,
+                "message": "This service has no price yet",
+                "errors": {"services": unpriced}
+            }, status=400)
+
         user = request.user
+        now = timezone.now()
+        with transaction.atomic():
+            # the cart row lock serialises concurrent bulk updates of the same basket
+            cart = Cart.objects.select_for_update().filter(user=user).order_by("id").first()
+            if cart is None:
+                cart = Cart.objects.create(user=user)
+
+            existing = {}
+            for item in cart.services.filter(service_id__in=list(operations)).order_by("id"):
+                existing.setdefault(item.service_id, item)
+
+            created, updated, removed = [], [], []
+            for service_id, op in operations.items():
+                item = existing.get(service_id)
+                if op["qty"] == 0:
+                    if item is not None:
+                        removed.append(item.id)
+                    continue
+                if item is None:
+                    item = ServiceCart(cart=cart, service_id=service_id)
+                    created.append(item)
+                else:
+                    item.updated_date = now
+                    updated.append(item)
+                item.qty = op["qty"]
+                item.num_of_tech = op["num_of_tech"]
+                item.price = services[service_id].price
+                item.total_price = item.qty * item.num_of_tech * item.price
+
+            ServiceCart.objects.bulk_create(created)
+            ServiceCart.objects.bulk_update(updated, ["qty", "num_of_tech", "price", "total_price", "updated_date"])
+            ServiceCart.objects.filter(id__in=removed).delete()
+
+        items = cart.services.select_related("service").order_by("id")
+        total = (items.aggregate(total=Sum("total_price"))["total"] or Decimal("0")).quantize(Decimal("0.01"))
 
-        # ✅ Generate 6-digit OTP
-        otp = str(random.randint(100000, 999999))
+        return Response({
+            "status": 200,
+            "message": "Cart updated",
+            "data": {
+                "items": ServiceCartSerializer(items, many=True).data,
+                "total": total,
+                "added": len(created),
+                "updated": len(updated),
+                "removed": len(removed),
+            }
+        }, status=200)
+
+
+class GeneratePaymentOTPView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # ✅ Create empty booking with OTP OR store in session
+    @idempotent
+    def post(self, request):
+        user = request.user
+
+        # ✅ Create empty booking, the OTP is kept in the OTP store against it
         booking = ServiceBook.objects.create(
             user=user,
             service=None,  # service will be attached later at checkout
-            service_start_otp=otp,
             otp_generated_at=timezone.now(),
             status="pending"
         )
 
+        # ✅ Generate 6-digit OTP
+        otp = get_otp_store().issue("payment", booking.id)
+
         # TODO: Send OTP via SMS/Email (integrate Twilio, AWS SNS, or SMTP)
 
         return Response({
@@ -444,7 +535,7 @@ class GeneratePaymentOTPView(APIView):
 class RazorpayCheckoutView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
+    @idempotent
     def post(self, request):
         user = request.user
         otp = request.data.get("otp")
@@ -453,94 +544,109 @@ class RazorpayCheckoutView(APIView):
         if not otp or not booking_id:
             return Response({"status": 400, "message": "OTP & booking_id required"}, status=400)
 
+        otp_store = get_otp_store()
+        if not otp_store.verify("payment", booking_id, otp):
+            return Response({"status": 400, "message": "Invalid OTP"}, status=400)
+
         try:
-            booking_obj = ServiceBook.objects.get(id=booking_id, user=user, service_start_otp=otp)
+            booking_obj = ServiceBook.objects.get(id=booking_id, user=user)
         except ServiceBook.DoesNotExist:
             return Response({"status": 400, "message": "Invalid OTP"}, status=400)
 
-        # ✅ OTP verified
-        booking_obj.otp_verified_at = timezone.now()
-        booking_obj.otp_verified_by = user
-        booking_obj.save()
-
         cart = Cart.objects.filter(user=user).first()
-        if not cart or not cart.services.exists():
+        items = list(cart.services.select_related("service")) if cart else []
+        if not items:
             return Response({"status": 400, "message": "Cart is empty"}, status=400)
 
         default_address = Address.objects.filter(user=user, is_default=True).first()
         if not default_address:
             return Response({"status": 400, "message": "No default address found"}, status=400)
 
-        bookings = []  # real ServiceBook objects
+        # best approved provider per service around the customer's location (customer/matching.py)
+        matched = match_providers(user.latitude, user.longitude, [item.service for item in items], exclude={user.pk})
+        providers = CustomerProfile.objects.in_bulk(set(matched.values()))
+
         bookings_response = []  # dicts for API response
         total_amount = Decimal("0.0")
-        notifications_list = []
 
-        for item in cart.services.all():
-            service_provider = None  
-            booking_status = 'assign' if service_provider else 'pending'
+        # Only local writes happen in the transaction. The gateway order is
+        # recorded in the outbox and created after commit.
+        with transaction.atomic():
+            # ✅ OTP verified
+            booking_obj.otp_verified_at = timezone.now()
+            booking_obj.otp_verified_by = user
+            booking_obj.save()
+
+            bookings = []  # real ServiceBook objects, inserted in CHECKOUT_BATCH_SIZE batches below
+            for item in items:
+                service_provider = providers.get(matched.get(item.service_id))
+                booking_status = 'assign' if service_provider else 'pending'
+
+                bookings.append(ServiceBook(
+                    user=user,
+                    service=item.service,
+                    technician_required=item.num_of_tech,
+                    status=booking_status,
+                    is_scheduled=False,
+                    service_start_otp=otp,
+                    otp_generated_at=booking_obj.otp_generated_at,
+                    assigned_technician=service_provider
+                ))
+                total_amount += item.total_price
+
+            ServiceBook.objects.bulk_create(bookings, batch_size=settings.CHECKOUT_BATCH_SIZE)
+
+            notifications_list = create_booking_notifications(
+                [booking for booking in bookings if booking.assigned_technician]
+            )
 
-            booking = ServiceBook.objects.create(
+            for item, booking in zip(items, bookings):
+                service_provider = booking.assigned_technician
+
+                bookings_response.append({
+                    "id": booking.id,
+                    "service": item.service.name,
+                    "assigned_service_provider": service_provider.username if service_provider else None,
+                    "status": booking.status,
+                    "scheduled_time": getattr(booking, "scheduled_time", None),
+                    "created_at": getattr(booking, "created_at", timezone.now())
+                })
+
+            # ✅ Save payment with ServiceBook instance, the order id is filled in once the gateway answers
+            payment = Payment.objects.create(
+                booking=bookings[0],  # first booking object
                 user=user,
-                service=item.service,
-                technician_required=item.num_of_tech,
-                status=booking_status,
-                is_scheduled=False,
-                service_start_otp=otp,
-                otp_generated_at=booking_obj.otp_generated_at,
-                assigned_technician=service_provider
+                amount=total_amount,
+                status="pending"
             )
+            outbox = enqueue_order(payment)
 
-            bookings.append(booking)  # ✅ save the instance
-            total_amount += Decimal(str(item.total_price))
-
-            if service_provider:
-                booking_notifications = create_booking_notifications(
-                    user_profile=booking.user,
-                    service_provider_profile=booking.assigned_technician,
-                    booking=booking
-                )
-                notifications_list.append(booking_notifications)
-
-            bookings_response.append({
-                "id": booking.id,
-                "service": item.service.name,
-                "assigned_service_provider": service_provider.username if service_provider else None,
-                "status": booking_status,
-                "scheduled_time": getattr(booking, "scheduled_time", None),
-                "created_at": getattr(booking, "created_at", timezone.now())
-            })
+            # Clear the cart
+            cart.services.all().delete()
+            otp_store.consume("payment", booking_id)
 
-        # ✅ Razorpay order
-        razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        razorpay_order = razorpay_client.order.create({
-            "amount": int(total_amount * 100),
-            "currency": "INR",
-            "payment_capture": "1"
-        })
+        # ✅ Razorpay order, a failed attempt stays queued for dispatch_payment_orders
+        outbox = dispatch_order(outbox.id) or outbox
+        order_id = outbox.payment.order_id if outbox.status == PaymentOrderOutbox.SENT else None
 
-        # ✅ Save payment with ServiceBook instance
-        payment = Payment.objects.create(
-            booking=bookings[0],  # first booking object
-            user=user,
-            order_id=razorpay_order["id"],
-            amount=total_amount,
-            status="pending"
-        )
-
-        # Clear the cart
-        cart.services.all().delete()
+        if outbox.status == PaymentOrderOutbox.SENT:
+            status_code, message = 200, "Checkout successful"
+        elif outbox.status == PaymentOrderOutbox.PENDING:
+            status_code, message = 202, "Checkout saved, payment order is being created"
+        else:
+            status_code, message = 502, "Payment order could not be created"
 
         # ✅ Build full response
         response_data = {
-            "status": 200,
-            "message": "Checkout successful",
+            "status": status_code,
+            "message": message,
             "data": {
                 "payment": {
+                    "id": payment.id,
                     "total_amount": str(total_amount),
                     "currency": "INR",
-                    "razorpay_order_id": razorpay_order["id"],
-                    "payment_status": razorpay_order.get("status", "created"), 
+                    "razorpay_order_id": order_id,
+                    "payment_status": "created" if order_id else outbox.status,
                 },
                 "bookings": bookings_response,
                 "customer": {
@@ -566,22 +672,59 @@ class RazorpayCheckoutView(APIView):
             }
         }
 
-        return Response(response_data)
+        return Response(response_data, status=status_code)
+
+
+class PaymentOrderStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, payment_id):
+        """Gateway order state for a checkout that answered 202, retried here if it is due"""
+        payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+        outbox = PaymentOrderOutbox.objects.filter(payment=payment).first()
+
+        if outbox and outbox.status == PaymentOrderOutbox.PENDING and outbox.next_attempt_at <= timezone.now():
+            if dispatch_order(outbox.id):
+                payment.refresh_from_db()
+                outbox.refresh_from_db()
+
+        return Response({
+            "status": 200,
+            "message": "Payment order status",
+            "data": {
+                "payment_id": payment.id,
+                "amount": str(payment.amount),
+                "payment_status": payment.status,
+                "razorpay_order_id": payment.order_id,
+                "order_status": outbox.status if outbox else PaymentOrderOutbox.SENT,
+                "attempts": outbox.attempts if outbox else None,
+                "next_attempt_at": outbox.next_attempt_at if outbox and outbox.status == PaymentOrderOutbox.PENDING else None,
+            }
+        })
 
-    
 
 class RazorpayVerifyPaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
+        """
+        Confirm a payment from the Checkout signature. The check is local;
+        method and invoice details from the gateway arrive later through the
+        webhook (see customer/webhooks.py).
+        """
         razorpay_payment_id = request.data.get("razorpay_payment_id")
         razorpay_order_id = request.data.get("razorpay_order_id")
         razorpay_signature = request.data.get("razorpay_signature")
 
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+        if not razorpay_payment_id or not razorpay_order_id or not razorpay_signature:
+            return Response({
+                "status": 400,
+                "message": "razorpay_order_id, razorpay_payment_id and razorpay_signature are required"
+            }, status=400)
 
         try:
-            client.utility.verify_payment_signature({
+            get_client().utility.verify_payment_signature({
                 "razorpay_order_id": razorpay_order_id,
                 "razorpay_payment_id": razorpay_payment_id,
                 "razorpay_signature": razorpay_signature
@@ -589,33 +732,50 @@ class RazorpayVerifyPaymentView(APIView):
         except razorpay.errors.SignatureVerificationError:
             return Response({"status": 400, "message": "Signature verification failed"}, status=400)
 
-        # ✅ Find Payment by order_id
-        try:
-            payment = Payment.objects.get(order_id=razorpay_order_id)
-        except Payment.DoesNotExist:
-            return Response({"status": 404, "message": "Payment record not found"}, status=404)
-        
-        if payment.status == "success":
-            return Response({"status": 200, "message": "Payment already verified"})
+        # A valid signature only proves the gateway saw this payment on this order, not who is
+        # asking, so only the caller's own payment is touched. pk keeps a claims user unloaded.
+        payments = Payment.objects.filter(order_id=razorpay_order_id, user_id=request.user.pk)
+        verified = payments.filter(status__in=["pending", "failed"]).update(
+            payment_id=razorpay_payment_id,
+            status="success",
+            method=request.data.get("method", ""),
+            updated_at=timezone.now(),
+        )
 
-        details = client.payment.fetch(razorpay_payment_id)
+        # ✅ Find the caller's Payment by order_id
+        payment = (
+            payments.values("order_id", "payment_id", "status", "amount", "user__username", "user__email")
+            .first()
+        )
+        if payment is None:
+            return Response({"status": 404, "message": "Payment record not found"}, status=404)
 
-        # Update with payment_id and success
-        payment.payment_id = razorpay_payment_id
-        payment.status = "success"
-        payment.method = request.data.get("method", "")
-        payment.receipt_url = details.get("invoice_id", "")
-        payment.save()
+        if not verified:
+            return Response({"status": 200, "message": "Payment already verified"})
 
         return Response({
             "status": 200,
             "message": "Payment verified successfully",
             "data": {
-                "order_id": payment.order_id,
-                "payment_id": payment.payment_id,
-                "status": payment.status,
-                "amount": str(payment.amount),
-                "username": payment.user.username,
-                "email": payment.user.email 
+                "order_id": payment["order_id"],
+                "payment_id": payment["payment_id"],
+                "status": payment["status"],
+                "amount": str(payment["amount"]),
+                "username": payment["user__username"],
+                "email": payment["user__email"]
             }
-        })
\ No newline at end of file
+        })
+
+
+class RazorpayWebhookView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """Store a signed gateway event for process_payment_webhooks, nothing else happens in the request"""
+        body = request.body
+        if not valid_signature(body, request.headers.get(SIGNATURE_HEADER)):
+            return Response({"status": 400, "message": "Invalid signature"}, status=400)
+
+        record_event(body, request.headers.get(EVENT_ID_HEADER))
+        return Response({"status": 200, "message": "Event received"})
@@ -0,0 +1,147 @@
+import hashlib
+import hmac
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, PaymentWebhookEvent
+
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Razorpay-Signature"
+EVENT_ID_HEADER = "X-Razorpay-Event-Id"
+
+# gateway payment status -> Payment.status; other statuses (created, authorized) change nothing
+PAYMENT_STATUSES = {
+    "captured": "success",
+    "failed": "failed",
+    "refunded": "refunded",
+}
+
+# Payment.status -> statuses an event may move it to. A failed attempt on an
+# order never undoes a success, and nothing undoes a refund.
+TRANSITIONS = {
+    "pending": {"pending", "success", "failed", "refunded"},
+    "failed": {"failed", "success", "refunded"},
+    "success": {"success", "refunded"},
+    "refunded": {"refunded"},
+}
+
+UPDATED_FIELDS = ["status", "payment_id", "method", "receipt_url", "updated_at"]
+
+# captured for another amount than the payment is for, left pending for manual review
+MISMATCH = "amount mismatch (review)"
+
+
+def in_paise(amount):
+    return int((amount * 100).to_integral_value())
+
+
+def valid_signature(body, signature):
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def record_event(body, event_id=None):
+    """
+    Store a verified delivery as-is with a single INSERT. Redeliveries of
+    an event already stored are dropped by the unique event id.
+    """
+    event_id = (event_id or hashlib.sha256(body).hexdigest())[:64]
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(event_id=event_id, body=body.decode("utf-8", "replace"))],
+        ignore_conflicts=True,
+    )
+
+
+def payment_update(event):
+    """
+    (order_id, changes, amount in paise) for an event carrying a payment
+    entity, or None if it changes nothing.
+    """
+    entity = (event.get("payload") or {}).get("payment", {}).get("entity")
+    if not entity or not entity.get("order_id"):
+        return None
+    status = PAYMENT_STATUSES.get(entity.get("status"))
+    if status is None:
+        return None
+    return entity["order_id"], {
+        "status": status,
+        "payment_id": entity.get("id"),
+        "method": entity.get("method") or "",
+        "receipt_url": entity.get("invoice_id") or "",
+    }, entity.get("amount")
+
+
+def process_batch(batch_size=500):
+    """
+    Apply up to `batch_size` unprocessed events, oldest first, in one
+    transaction: one SELECT for the events, one for their payments, then a
+    bulk_update of each. Returns the number of events handled. Workers
+    running side by side skip each other's locked rows. A capture for
+    another amount than the payment's is not applied; the payment stays
+    pending and the event keeps the mismatch as its error, as in
+    customer/reconciliation.py.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        updates = {}
+        for event in events:
+            try:
+                update = payment_update(json.loads(event.body))
+            except (ValueError, AttributeError, TypeError) as exc:
+                event.error = f"Unreadable event: {exc}"
+                continue
+            if update is not None:
+                order_id, changes, amount = update
+                updates.setdefault(order_id, []).append((event, changes, amount))
+
+        changed = []
+        payments = Payment.objects.select_for_update().filter(order_id__in=list(updates))
+        found = set()
+        for payment in payments:
+            found.add(payment.order_id)
+            dirty = False
+            for event, changes, amount in updates[payment.order_id]:
+                if changes["status"] not in TRANSITIONS.get(payment.status, ()):
+                    continue
+                expected = in_paise(payment.amount)
+                if changes["status"] == "success" and amount != expected:
+                    event.error = f"{MISMATCH}: expected {expected} paise, {changes['payment_id']} captured {amount}"
+                    logger.warning(
+                        "Payment #%s left pending for review: order %s expected %s paise, webhook %s captured %s",
+                        payment.id, payment.order_id, expected, event.event_id, amount,
+                    )
+                    continue
+                for name, value in changes.items():
+                    setattr(payment, name, value)
+                dirty = True
+            if dirty:
+                payment.updated_at = now
+                changed.append(payment)
+
+        for order_id in set(updates) - found:
+            for event, _, _ in updates[order_id]:
+                event.error = f"No payment for order {order_id}"
+                logger.warning("Webhook %s refers to unknown order %s", event.event_id, order_id)
+
+        Payment.objects.bulk_update(changed, UPDATED_FIELDS)
+        for event in events:
+            event.processed_at = now
+        PaymentWebhookEvent.objects.bulk_update(events, ["processed_at", "error"])
+    return len(events)
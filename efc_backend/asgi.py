@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'efc_backend.settings')
 
 application = get_asgi_application()
+
+# Warm the user-agent parser before the first login hits this worker
+from customer.devices import warm_up  # noqa: E402
+
+warm_up()
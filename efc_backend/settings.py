@@ -65,6 +65,108 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# Keyset pagination for list endpoints (?limit=&cursor=, see admin_panel/pagination.py)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Resolved users for CustomerJWTAuthentication (see admin_panel/user_cache.py)
+AUTH_USER_CACHE = {
+    'LOCAL_TTL': 30,
+    'SHARED_TTL': 300,
+    'MAX_ENTRIES': 10000,
+}
+
+# Trust the role/is_blocked claims in access tokens instead of loading the
+# profile on every request. The profile is still loaded lazily on first use.
+# Needs a shared cache (see CACHES), it is ignored with a per-process one.
+AUTH_STATELESS_CLAIMS = os.environ.get('AUTH_STATELESS_CLAIMS', 'False') == 'True'
+
+# Serialized catalog responses, invalidated by a version bump on any catalog change.
+# The version is kept in the shared cache (see CACHES).
+CATALOG_CACHE = {
+    'TTL': 3600,
+    'LOCK_TIMEOUT': 10,
+}
+
+# Scoring for the precomputed home-screen sections (see admin_panel/rankings.py)
+SECTION_RANKINGS = {
+    'WEIGHT_7D': 3.0,
+    'WEIGHT_30D': 1.0,
+    'RECENCY_SECONDS': 86400,
+    'NEW_DAYS': 30,
+}
+
+# Parsed User-Agent headers kept per worker (see customer/devices.py)
+USER_AGENT_CACHE_SIZE = 1024
+
+# SystemLog rows are queued and bulk inserted off the request path (see customer/audit.py)
+SYSTEM_LOG_BUFFER = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.5,
+}
+
+# Resized WebP/JPEG copies of uploaded images, made in the background (see customer/images.py)
+IMAGE_VARIANTS = {
+    'ENABLED': True,
+    'WIDTHS': [160, 320, 640],
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+}
+
+# `manage.py archive_system_logs` moves whole months older than this to gzipped JSONL
+SYSTEM_LOG_RETENTION_DAYS = 180
+SYSTEM_LOG_ARCHIVE_DIR = BASE_DIR / 'archives' / 'system_logs'
+
+# In-memory geo and skill indexes of approved providers used to assign technicians at checkout
+# (see customer/matching.py, customer/skills.py and customer/index_sync.py). Workers pick up
+# each other's changes through a log in the shared cache (see CACHES).
+PROVIDER_MATCHING = {
+    'CELL_DEGREES': 0.05,
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 100,
+    'CANDIDATES': 20,
+    'REBUILD_INTERVAL': 3600,
+}
+
+# How checkout picks among the nearest candidates (see customer/ranking.py)
+PROVIDER_RANKING = {
+    'DISTANCE_WEIGHT': 0.6,
+    'DISTANCE_SCALE_KM': 5,
+    'EXPERIENCE_WEIGHT': 0.25,
+    'LOAD_WEIGHT': 0.15,
+    'EXPERIENCE_CAP': 10,
+    'LOAD_CAP': 5,
+}
+
+# `manage.py reconcile_payments` settles payments left pending for MIN_AGE seconds (see customer/reconciliation.py)
+PAYMENT_RECONCILIATION = {
+    'MIN_AGE': 1800,
+    'CHUNK_SIZE': 1000,
+    'WORKERS': 16,
+    'CHECKPOINT_FILE': BASE_DIR / 'archives' / 'checkpoints' / 'reconcile_payments.json',
+}
+
+# Stored responses for requests sent with an Idempotency-Key header (see customer/idempotency.py).
+# Seconds; `manage.py purge_idempotency_keys` deletes expired rows.
+IDEMPOTENCY = {
+    'TTL': 86400,
+    'WAIT_TIMEOUT': 15,
+    'LOCK_TIMEOUT': 60,
+}
+
+# Login/registration/payment OTPs (see customer/otp.py). TTL is in seconds;
+# `manage.py purge_expired_otps` deletes expired database rows.
+OTP_STORE = {
+    'BACKEND': 'customer.otp.DatabaseOTPStore',  # or 'customer.otp.CacheOTPStore'
+    'TTL': {
+        'login': 600,
+        'register': 600,
+        'payment': 1800,
+    },
+}
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -110,8 +212,55 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker. Claims revocations (admin_panel/authentication.py), the
+# catalog cache version and rebuild lock (admin_panel/catalog_cache.py) and the provider index
+# change log (customer/index_sync.py) live here, so production needs REDIS_URL; without it each
+# process gets its own LocMemCache, which is only right for a single development server, and
+# AUTH_STATELESS_CLAIMS is refused.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET')
+RAZORPAY_BASE_URL = os.environ.get('RAZORPAY_BASE_URL', 'https://api.razorpay.com')
+# Signs POSTs to /api/customer/razorpay/webhook/, set the same secret in the Razorpay dashboard
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET')
+
+# Shared keep-alive client for the gateway (see customer/gateway.py). Timeouts are in seconds;
+# after BREAKER_FAILURES consecutive failures calls fail fast for BREAKER_RESET seconds.
+PAYMENT_GATEWAY = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'POOL_SIZE': 20,
+    'BREAKER_FAILURES': 5,
+    'BREAKER_RESET': 30,
+}
+
+# Gateway orders are created after the checkout transaction commits (see customer/payments.py).
+# Failed attempts are retried by `manage.py dispatch_payment_orders`.
+PAYMENT_OUTBOX = {
+    'MAX_ATTEMPTS': 8,
+    'RETRY_DELAY': 15,
+    'MAX_RETRY_DELAY': 900,
+    'LEASE': 60,
+}
+
+# Rows per INSERT when checkout writes its bookings (and twice as many for their notifications),
+# so a cart up to this size costs one statement per table. SQLite caps a statement at 999
+# parameters, Django splits sooner there whatever this says.
+CHECKOUT_BATCH_SIZE = 500
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from customer.models import CustomerProfile, Address, BankDetail
+from customer.images import ImageVariantsField
 
 class ServiceRegisterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -36,6 +37,7 @@ class AddressSerializer(serializers.ModelSerializer):
 
 class ServiceProfileSerializer(serializers.ModelSerializer):
     addresses = AddressSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = CustomerProfile
@@ -58,10 +60,11 @@ class BankDetailSerializer(serializers.ModelSerializer):
 
 class ServiceProviderProfileSerializer(serializers.ModelSerializer):
     addresses = AddressSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = CustomerProfile
-        exclude = ["otp", "otp_created_at", "updated_date"]
+        exclude = ["updated_date"]
 
 
 class BankDetailSerializer(serializers.ModelSerializer):
@@ -3,8 +3,10 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from .serializers import *
 from customer.models import CustomerProfile, SystemLog, PendingProfileUpdate, BankDetail, PendingBankDetailUpdate
-from rest_framework_simplejwt.tokens import RefreshToken
-from user_agents import parse
+from admin_panel.authentication import tokens_for_user
+from customer.devices import detect_device
+from customer.audit import system_log
+from admin_panel.pagination import paginate
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied
@@ -32,7 +34,7 @@ class ServiceProviderRegisterAPIView(APIView):
             )
 
             # Generate OTP
-            otp = service_provider.create_otp()
+            otp = service_provider.create_otp('register')
 
             return Response({
                 "status": 200,
@@ -68,15 +70,13 @@ class VerifyRegisterOTPAPIView(APIView):
             return Response({"status": 404, "message": "User not found"}, status=404)
 
         # Check OTP expiry
-        if not customer.is_otp_valid():
+        if not customer.is_otp_valid('register'):
             return Response({"status": 400, "message": "OTP expired"}, status=400)
 
         # Match OTP
-        if customer.otp == otp_entered:
+        if customer.otp_verify(otp_entered, 'register'):
             # Clear OTP after successful verification
-            customer.otp = None
-            customer.otp_created_at = None
-            customer.save()
+            customer.clear_otp('register')
 
             return Response({
                 "status": 200,
@@ -110,10 +110,8 @@ class LoginVerifyServiceOTPView(APIView):
         if not user.otp_verify(otp_entered):
             return Response({"status": 400, "message": "Invalid OTP"}, status=400)
 
-        # OTP verified → clear OTP fields
-        user.otp = None
-        user.otp_created_at = None
-        user.save()
+        # OTP verified → clear OTP
+        user.clear_otp()
 
         if not user.is_admin_verified:
             return Response({
@@ -128,28 +126,17 @@ class LoginVerifyServiceOTPView(APIView):
             }, status=403)
 
         # Device Detection
-        user_agent_str = request.META.get("HTTP_USER_AGENT", "")
-        user_agent = parse(user_agent_str)
-        device_type = "PC"
-        if user_agent.is_mobile:
-            device_type = "Mobile"
-        elif user_agent.is_tablet:
-            device_type = "Tablet"
-        elif user_agent.is_bot:
-            device_type = "Bot"
-
-        os_name = user_agent.os.family
-        browser = user_agent.browser.family
+        device_type, os_name, browser = detect_device(request.META.get("HTTP_USER_AGENT", ""))
 
         # Save login log
-        SystemLog.objects.create(
+        system_log.log(
             type="login",
             performed_by=user,
             remark=f"Login from {device_type} using {browser} on {os_name}"
         )
 
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         access = refresh.access_token
 
         # ✅ Serialize full user data
@@ -219,10 +206,10 @@ class BankDetailView(APIView):
 
     def get(self, request):
         profile = self.get_profile(request)
-        bank_details = profile.bank_details.all()
+        bank_details, next_cursor = paginate(request, profile.bank_details.all())
         serializer = BankDetailSerializer(bank_details, many=True)
         return Response(
-            {"status": 200, "message": "Bank details retrieved", "data": serializer.data}
+            {"status": 200, "message": "Bank details retrieved", "data": serializer.data, "next_cursor": next_cursor}
         )
 
     def post(self, request):